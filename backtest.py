@@ -0,0 +1,224 @@
+import os
+import time
+import heapq
+import argparse
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore, timeframe_ms
+from scanner import compute_indicators
+from resample import resample, align, ema
+from ledger import HISTORY_COLUMNS
+from strategy import (entry_signals, in_session, initial_sl, sl_hit, trail_trigger,
+                      trail_update, trade_roe, trade_pnl, htf_filter)
+
+# ==========================================
+# 🧪 BACKTEST (replays candles through the live strategy rules)
+# ==========================================
+# Timing model, per bar k of a symbol:
+#   * a signal on closed bar i is entered at close[i] (the live bot acts on df.iloc[-2])
+#   * from bar i+1 the SL is checked against the bar's low/high first (fill at SL, or
+#     at the open if the bar gapped through it), then one trailing step on the close
+#   * a freed symbol can re-enter on the bar after its exit
+#   * margin = realized balance * PCT at entry time; exits at the same time are not yet
+#     counted, just like the live cycle reads the balance before the manager runs
+
+def live_params():
+    """Strategy settings exactly as configured at the top of main.py."""
+    import main
+    return dict(
+        initial_balance=main.INITIAL_BALANCE, pct_balance_per_trade=main.PCT_BALANCE_PER_TRADE,
+        leverage=main.LEVERAGE, initial_sl_roe=main.INITIAL_SL_ROE, trailing_step_roe=main.TRAILING_STEP_ROE,
+        start_hour_utc=main.START_HOUR_UTC, end_hour_utc=main.END_HOUR_UTC,
+        **main.ENTRY_THRESHOLDS,
+    )
+
+def prepare(df, timeframe, htf=None):
+    """Candles -> dict of 1D arrays incl. indicators. Parameter independent, compute once.
+
+    htf: also roll the candles up to this timeframe and attach the close / EMA200 of
+    the last HTF bar closed at each bar's close (the live HTF_FILTER).
+    """
+    d = {k: df[k].to_numpy(dtype=float) for k in ('open', 'high', 'low', 'close', 'volume')}
+    d['timestamp'] = df['timestamp'].to_numpy(dtype=np.int64)
+    ind = compute_indicators(d['high'], d['low'], d['close'], d['volume'])
+    d.update({k: v[0] for k, v in ind.items()})
+    # the live bot decides when bar i has closed, i.e. at timestamp + timeframe
+    d['decided_at'] = d['timestamp'] + timeframe_ms(timeframe)
+    d['hour'] = (d['decided_at'] // 3_600_000) % 24
+    if htf:
+        bars = resample(df, htf)
+        d['htf_close'] = align(d['timestamp'], timeframe, bars['timestamp'], htf, bars['close'])
+        d['htf_ema200'] = align(d['timestamp'], timeframe, bars['timestamp'], htf, ema(bars['close'].to_numpy()))
+    return d
+
+def _next_event(side, d, start, sl, trigger, chunk=256):
+    """First bar >= start that touches `sl` or closes beyond `trigger`. Returns (bar, is_sl)."""
+    n = len(d['close'])
+    lo = start
+    while lo < n:
+        hi = min(n, lo + chunk)
+        if side == 'LONG':
+            hit = d['low'][lo:hi] <= sl
+            up = d['close'][lo:hi] >= trigger
+        else:
+            hit = d['high'][lo:hi] >= sl
+            up = d['close'][lo:hi] <= trigger
+        events = hit | up
+        if events.any():
+            k = int(events.argmax())
+            return lo + k, bool(hit[k])
+        lo, chunk = hi, chunk * 2
+    return n, False
+
+def simulate_symbol(d, params):
+    """Return [(entry_bar, exit_bar, side, entry, exit, reason)] for one symbol."""
+    lev, sl_roe, step_roe = params['leverage'], params['initial_sl_roe'], params['trailing_step_roe']
+    sig = entry_signals(d['close'], d['volume'], d['ema200'], d['adx'], d['vol_ma'], d['vwap'], d['rsi7'],
+                        **{k: params[k] for k in ('rsi_long', 'rsi_short', 'adx_min', 'vol_mult') if k in params})
+    session = in_session(d['hour'], params['start_hour_utc'], params['end_hour_utc'])
+    longs, shorts = sig['long_entry'] & session, sig['short_entry'] & session
+    if 'htf_close' in d:
+        long_ok, short_ok = htf_filter(d['htf_close'], d['htf_ema200'])
+        longs, shorts = longs & long_ok, shorts & short_ok
+    candidates = np.flatnonzero(longs | shorts)
+
+    trades = []
+    n = len(d['close'])
+    pos = 0
+    while pos < len(candidates):
+        i = int(candidates[pos])
+        side = 'LONG' if longs[i] else 'SHORT'
+        entry = d['close'][i]
+        sl, step = initial_sl(side, entry, sl_roe, lev), 0
+        j = i + 1
+        while True:
+            k, is_sl = _next_event(side, d, j, sl, trail_trigger(side, entry, step, step_roe, lev))
+            if k >= n:
+                k, exit_price, reason = n - 1, d['close'][-1], "End of Backtest"
+                break
+            if is_sl and sl_hit(side, d['low'][k] if side == 'LONG' else d['high'][k], sl):
+                gap = d['open'][k]
+                exit_price = min(sl, gap) if side == 'LONG' else max(sl, gap)
+                reason = "SL/Trailing Hit"
+                break
+            upgrade = trail_update(side, entry, step, d['close'][k], step_roe, lev)
+            if upgrade: step, sl = upgrade
+            j = k + 1
+        trades.append((i, k, side, entry, exit_price, reason))
+        pos = int(np.searchsorted(candidates, k + 1))
+    return trades
+
+def run_backtest(datasets, params):
+    """datasets: {symbol: prepare(...) output}. Returns (history DataFrame, stats dict)."""
+    opened = []
+    for symbol, d in datasets.items():
+        for i, k, side, entry, exit_price, reason in simulate_symbol(d, params):
+            opened.append((int(d['decided_at'][i]), int(d['decided_at'][k]), symbol, side, entry, exit_price, reason))
+    opened.sort()
+
+    balance = params['initial_balance']
+    pending, rows = [], []
+
+    def realize():
+        nonlocal balance
+        exit_at, _, symbol, side, entry, exit_price, reason, margin = heapq.heappop(pending)
+        roe = trade_roe(side, entry, exit_price, params['leverage'])
+        pnl = trade_pnl(margin, roe)
+        balance += pnl
+        rows.append([symbol, side, entry, exit_price, pnl, roe, "WIN" if pnl > 0 else "LOSS", reason,
+                     balance, str(pd.Timestamp(exit_at, unit='ms'))])
+
+    for seq, (entry_at, exit_at, symbol, side, entry, exit_price, reason) in enumerate(opened):
+        while pending and pending[0][0] < entry_at: realize()
+        margin = balance * params['pct_balance_per_trade']
+        heapq.heappush(pending, (exit_at, seq, symbol, side, entry, exit_price, reason, margin))
+    while pending: realize()
+
+    history = pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+    return history, summarize(history, params['initial_balance'])
+
+def summarize(history, initial_balance):
+    equity = np.concatenate([[initial_balance], history['Balance_After'].to_numpy(dtype=float)])
+    peak = np.maximum.accumulate(equity)
+    final = float(equity[-1])
+    return {
+        'trades': len(history),
+        'win_rate': float((history['Result'] == 'WIN').mean() * 100) if len(history) else 0.0,
+        'pnl_usdt': final - initial_balance,
+        'roe_pct': (final - initial_balance) / initial_balance * 100,
+        'max_drawdown_pct': float(((peak - equity) / peak).max() * 100),
+        'final_balance': final,
+    }
+
+def synthetic_candles(bars, timeframe='5m', seed=0):
+    """Random-walk OHLCV for benchmarks (no exchange needed)."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, bars)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, bars))
+    ts = 1_700_000_000_000 + np.arange(bars, dtype=np.int64) * timeframe_ms(timeframe)
+    return pd.DataFrame({'timestamp': ts, 'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(1, 100, bars)})
+
+def benchmark(symbols=5, days=365, timeframe='5m'):
+    bars = days * 86_400_000 // timeframe_ms(timeframe)
+    frames = {f"SYN{i}/USDT": synthetic_candles(bars, timeframe, seed=i) for i in range(symbols)}
+    params = live_params()
+
+    started = time.perf_counter()
+    datasets = {s: prepare(df, timeframe) for s, df in frames.items()}
+    prepared = time.perf_counter()
+    history, stats = run_backtest(datasets, params)
+    done = time.perf_counter()
+
+    total = bars * symbols
+    print(f"🏁 {symbols} symbols x {bars} bars = {total:,} bars, {stats['trades']} trades")
+    print(f"   indicators {prepared - started:.2f}s | simulation {done - prepared:.2f}s | "
+          f"total {done - started:.2f}s | {total / (done - started):,.0f} bars/sec")
+
+def load_history(symbols, timeframe, root, fetch_days=0):
+    """Load candles from a CandleStore, optionally topping it up from OKX first."""
+    bars = max(fetch_days, 1) * 86_400_000 // timeframe_ms(timeframe)
+    store = CandleStore(root, warmup_bars=bars, retention_bars=bars)
+    frames = {}
+    if fetch_days:
+        import main
+        for symbol in symbols:
+            def fetch(since, limit, symbol=symbol):
+                main._throttle(main.exchange)
+                return main.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+            print(f"📥 {symbol}: syncing {fetch_days} days...")
+            frames[symbol] = store.sync(fetch, symbol, timeframe)
+    else:
+        for symbol in symbols:
+            data = store.load(symbol, timeframe)
+            if len(data): frames[symbol] = pd.DataFrame(data)
+    return frames
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the live strategy on stored candles")
+    parser.add_argument('--bench', action='store_true', help="time a synthetic 1-year run")
+    parser.add_argument('--symbols', nargs='*', help="default: SYMBOLS from main.py")
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--data-dir', default='data/history')
+    parser.add_argument('--fetch-days', type=int, default=0, help="download/refresh N days from OKX first")
+    parser.add_argument('--out', help="write the trade_history-style table to this CSV")
+    parser.add_argument('--htf', help="higher-timeframe trend filter, e.g. 1h (default: HTF_FILTER from main.py)")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(timeframe=args.timeframe)
+    else:
+        import main
+        frames = load_history(args.symbols or main.SYMBOLS, args.timeframe, args.data_dir, args.fetch_days)
+        if not frames:
+            print(f"❌ No candles under {args.data_dir} (use --fetch-days)")
+            raise SystemExit(1)
+        htf = args.htf or main.HTF_FILTER
+        history, stats = run_backtest({s: prepare(df, args.timeframe, htf) for s, df in frames.items()}, live_params())
+        print(" | ".join(f"{k}: {v:,.2f}" if isinstance(v, float) else f"{k}: {v}" for k, v in stats.items()))
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+            history.to_csv(args.out, index=False)
+            print(f"💾 Saved {len(history)} trades to {args.out}")
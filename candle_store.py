@@ -0,0 +1,147 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from ring import RingBuffer
+
+# ==========================================
+# 🗄️ LOCAL OHLCV STORE (one append-only file per symbol/timeframe)
+# ==========================================
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+RECORD = np.dtype([('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'),
+                   ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')])
+
+TIMEFRAME_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+def timeframe_ms(timeframe):
+    return int(timeframe[:-1]) * TIMEFRAME_MS[timeframe[-1]]
+
+class CandleStore:
+    """Closed candles are appended to `<root>/<SYMBOL>_<tf>.bin` as fixed 48-byte records.
+
+    The forming (not yet closed) candle is never written; it is only returned
+    alongside the stored history so callers still see it as `df.iloc[-1]`.
+    sync() rereads the file on every call (one-shot runs); advance() keeps the
+    tail resident and hands back only the new bars (daemon).
+    """
+
+    def __init__(self, root='data/candles', warmup_bars=600, retention_bars=2000, page_limit=100):
+        self.root = root
+        self.warmup_bars = warmup_bars          # history needed to warm EMA200 / VWAP288
+        self.retention_bars = retention_bars    # older bars are trimmed away
+        self.page_limit = page_limit            # OKX history endpoint serves 100 per call
+        self.rings = {}                         # (symbol, tf) -> RingBuffer of RECORD, advance() only
+        self.sizes = {}                         # (symbol, tf) -> records in the file
+
+    def path(self, symbol, timeframe):
+        name = symbol.replace('/', '').replace(':', '_')
+        return os.path.join(self.root, f"{name}_{timeframe}.bin")
+
+    def load(self, symbol, timeframe):
+        path = self.path(symbol, timeframe)
+        if not os.path.exists(path): return np.empty(0, dtype=RECORD)
+        data = np.fromfile(path, dtype=RECORD)
+        # a crash mid-append can only leave a partial record at the tail; fromfile drops it
+        return data
+
+    def _write(self, symbol, timeframe, records, mode):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(symbol, timeframe)
+        if mode == 'ab':
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size % RECORD.itemsize:
+                # drop a torn record left by an interrupted append before adding more
+                with open(path, 'r+b') as f: f.truncate(size - size % RECORD.itemsize)
+            with open(path, 'ab') as f: records.tofile(f)
+        else:
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f: records.tofile(f)
+            os.replace(tmp, path)
+
+    def _fetch_new(self, fetch, timeframe, count, last_ts, now_ms):
+        """(fresh, closed, forming) record arrays newer than `last_ts` (a full warmup when fresh)."""
+        tf_ms = timeframe_ms(timeframe)
+        fresh = count < self.warmup_bars or last_ts < now_ms - self.retention_bars * tf_ms
+        since = now_ms - self.warmup_bars * tf_ms if fresh else last_ts + tf_ms
+        # align to candle open so the first page starts on a bar boundary
+        since -= since % tf_ms
+
+        rows = []
+        pages = (now_ms - since) // tf_ms // self.page_limit + 2
+        for _ in range(pages):
+            batch = fetch(since, self.page_limit)
+            if not batch: break
+            rows.extend(batch)
+            since = int(batch[-1][0]) + tf_ms
+            if len(batch) < self.page_limit or since > now_ms: break
+
+        fetched = np.array([tuple(r[:6]) for r in rows], dtype=RECORD)
+        if len(fetched):
+            fetched = fetched[np.unique(fetched['timestamp'], return_index=True)[1]]
+        if not fresh and len(fetched):
+            fetched = fetched[fetched['timestamp'] > last_ts]
+
+        is_closed = fetched['timestamp'] + tf_ms <= now_ms
+        return fresh, fetched[is_closed], fetched[~is_closed]
+
+    def sync(self, fetch, symbol, timeframe, now_ms=None):
+        """Bring the store up to date and return (stored history + forming bar) as a DataFrame.
+
+        `fetch(since, limit)` must return ccxt-style OHLCV rows in ascending order.
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        stored = self.load(symbol, timeframe)
+        last_ts = int(stored['timestamp'][-1]) if len(stored) else 0
+        fresh, closed, forming = self._fetch_new(fetch, timeframe, len(stored), last_ts, now_ms)
+
+        if fresh:
+            stored = closed
+            self._write(symbol, timeframe, stored, 'wb')
+        elif len(closed):
+            stored = np.concatenate([stored, closed])
+            self._write(symbol, timeframe, closed, 'ab')
+
+        # retention: rewrite once the file grows 25% past the limit, not on every bar
+        if len(stored) > self.retention_bars * 1.25:
+            stored = stored[-self.retention_bars:]
+            self._write(symbol, timeframe, stored, 'wb')
+
+        return pd.DataFrame(np.concatenate([stored, forming]), columns=COLUMNS)
+
+    # ---------- resident mode (daemon): the file is read once, cycles only append ----------
+    def advance(self, fetch, symbol, timeframe, now_ms=None):
+        """Like sync(), but the last `retention_bars` stay in a per-symbol ring between calls.
+
+        Returns (new closed records, forming records, reset); reset means the history was
+        (re)loaded or re-backfilled, so consumers should reseed from history().
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        key = (symbol, timeframe)
+        reset = key not in self.rings
+        if reset:
+            stored = self.load(symbol, timeframe)
+            self.rings[key] = RingBuffer(self.retention_bars, dtype=RECORD, values=stored)
+            self.sizes[key] = len(stored)
+        ring = self.rings[key]
+        last_ts = int(ring.last(1)['timestamp'][0]) if len(ring) else 0
+        fresh, closed, forming = self._fetch_new(fetch, timeframe, len(ring), last_ts, now_ms)
+
+        if fresh:
+            ring.clear()
+            ring.extend(closed)
+            self._write(symbol, timeframe, closed, 'wb')
+            self.sizes[key] = len(closed)
+        elif len(closed):
+            ring.extend(closed)
+            self._write(symbol, timeframe, closed, 'ab')
+            self.sizes[key] += len(closed)
+
+        if self.sizes[key] > self.retention_bars * 1.25:
+            self._write(symbol, timeframe, ring.view(), 'wb')
+            self.sizes[key] = len(ring)
+
+        return closed, forming, reset or fresh
+
+    def history(self, symbol, timeframe):
+        """Resident closed records, oldest first (advance() must have run for the symbol)."""
+        return self.rings[(symbol, timeframe)].view()
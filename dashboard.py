@@ -5,7 +5,10 @@ import plotly.graph_objects as go
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import ccxt
+from dashboard_data import DashboardData, mark_positions
+from price_cache import PriceCache
 
 # ==========================================
 # 🎨 1. CYBERPUNK STYLING (CSS INJECTION)
@@ -78,38 +81,46 @@ st.markdown("""
 # ⚠️ ข้อควรระวัง: ใน Streamlit Cloud ให้เอา JSON ใส่ใน Secrets
 # แต่ถ้า รัน Local ให้ใส่ชื่อไฟล์ JSON ตรงนี้ได้เลย
 SHEET_NAME = 'CryptoBot_TEST_TF5MIN'
+INITIAL_BALANCE = 200.0 # หรือค่าที่คุณตั้งไว้
+CHART_POINTS = 1500     # จุดสูงสุดต่อกราฟที่ส่งไป browser (ไม่ว่าประวัติจะยาวแค่ไหน)
+LEVERAGE = 10           # ต้องตรงกับ LEVERAGE ใน main.py (ใช้คำนวณ ROE เหมือน close_trade)
+PRICE_INTERVAL = 5      # วินาที: ดึงราคาทุกเหรียญที่เปิดอยู่ด้วย fetch_tickers ครั้งเดียว
+RANGES = {"1D": timedelta(days=1), "1W": timedelta(weeks=1), "1M": timedelta(days=30), "3M": timedelta(days=90), "All": None}
+
+@st.cache_resource # login ครั้งเดียว ใช้ร่วมกันทุก session
+def get_sheet():
+    # กรณีรัน Local: ใส่ path ไฟล์ json ตรงนี้
+    # creds_dict = json.load(open("your_key.json")) 
+    
+    # กรณีรัน Streamlit Cloud (แนะนำ): อ่านจาก st.secrets
+    creds_dict = dict(st.secrets["gcp_service_account"])
+    
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+    client = gspread.authorize(creds)
+    return client.open(SHEET_NAME)
+
+@st.cache_resource # ตัวเดียวทั้ง process: โหลดเฉพาะแถวใหม่ + เก็บสถิติสะสมไว้
+def get_data_service():
+    return DashboardData(get_sheet(), initial_balance=INITIAL_BALANCE, ttl=60) # อ่านชีตไม่ถี่กว่า 60 วินาที
+
+@st.cache_resource # ตัวเดียวทั้ง process: ผู้ชมกี่คนก็ยิง exchange เท่าเดิม
+def get_price_cache():
+    return PriceCache(ccxt.okx({'enableRateLimit': True}), interval=PRICE_INTERVAL)
 
-@st.cache_data(ttl=60) # Cache ข้อมูล 60 วินาที ไม่โหลดถี่เกินไป
 def load_data():
     try:
-        # กรณีรัน Local: ใส่ path ไฟล์ json ตรงนี้
-        # creds_dict = json.load(open("your_key.json")) 
-        
-        # กรณีรัน Streamlit Cloud (แนะนำ): อ่านจาก st.secrets
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        sheet = client.open(SHEET_NAME)
-        
-        # Load Data
-        summary_val = sheet.worksheet('summary').acell('B1').value
-        balance = float(summary_val) if summary_val else 0.0
-        
-        active_data = sheet.worksheet('active_trades').get_all_records()
-        history_data = sheet.worksheet('trade_history').get_all_records()
-        
-        df_active = pd.DataFrame(active_data)
-        df_history = pd.DataFrame(history_data)
-        
-        return balance, df_active, df_history
+        data = get_data_service()
+        data.refresh()
+        return data
     except Exception as e:
         st.error(f"Error connecting to Google Sheets: {e}")
-        return 0.0, pd.DataFrame(), pd.DataFrame()
+        return None
 
 # Load Data
-current_balance, df_active, df_history = load_data()
+data = load_data()
+current_balance = data.balance if data else 0.0
+df_active = data.active if data else pd.DataFrame()
 
 # ==========================================
 # 📊 3. DASHBOARD LAYOUT
@@ -123,16 +134,12 @@ st.markdown("---")
 # --- Top Metrics Row ---
 col1, col2, col3, col4 = st.columns(4)
 
-# คำนวณ Stats
-initial_balance = 200.0 # หรือค่าที่คุณตั้งไว้
-total_pnl_usdt = current_balance - initial_balance
-pnl_percent = (total_pnl_usdt / initial_balance) * 100
-
-win_rate = 0
-if not df_history.empty:
-    wins = len(df_history[df_history['Result'] == 'WIN'])
-    total_closed = len(df_history)
-    win_rate = (wins / total_closed) * 100
+# คำนวณ Stats (win rate / equity / drawdown อัปเดตสะสมใน DashboardData แล้ว)
+total_pnl_usdt = current_balance - INITIAL_BALANCE
+pnl_percent = (total_pnl_usdt / INITIAL_BALANCE) * 100
+win_rate = data.win_rate if data else 0
+has_history = bool(data and data.trades)
+has_equity = bool(data and data.equity.n)   # rows whose Timestamp parsed; the chart needs at least one
 
 def card_metric(label, value, color_hex="#00f2ff"):
     return f"""
@@ -156,11 +163,20 @@ with col4:
 # --- Charts Section ---
 st.markdown("### 📈 Equity Curve & Performance")
 
-if not df_history.empty:
-    # สร้างกราฟ Equity Curve แบบ Neon
-    df_history['Balance_After'] = pd.to_numeric(df_history['Balance_After'])
-    df_history['Timestamp'] = pd.to_datetime(df_history['Timestamp'])
-    df_history = df_history.sort_values('Timestamp')
+if has_equity:
+    # เลือกช่วงเวลา แล้วซูมละเอียดด้วย slider: server ตัดช่วง + ย่อจุดให้เหลือ <= CHART_POINTS ก่อนส่ง
+    # naive UTC for the slider (to_epoch below subtracts a naive epoch)
+    utc = lambda t: datetime.fromtimestamp(float(t), tz=timezone.utc).replace(tzinfo=None)
+    last_t, first_t = utc(data.equity['t'][-1]), utc(data.equity['t'][0])
+    span = RANGES[st.radio("Range", list(RANGES), index=len(RANGES) - 1, horizontal=True)]
+    range_start = max(first_t, last_t - span) if span else first_t
+    if range_start < last_t:
+        range_start, range_end = st.slider("Zoom", min_value=range_start, max_value=last_t,
+                                           value=(range_start, last_t), format="MM/DD HH:mm")
+    else:
+        range_end = last_t
+    to_epoch = lambda d: (d - datetime(1970, 1, 1)).total_seconds()
+    df_history, df_drawdown, raw_points = data.equity_view(to_epoch(range_start), to_epoch(range_end), CHART_POINTS)
     
     # Plotly Chart
     fig = go.Figure()
@@ -188,6 +204,39 @@ if not df_history.empty:
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"Trades: {data.trades:,} | Max Drawdown: {data.max_drawdown_pct:.2f}% | "
+               f"showing {len(df_history):,} of {raw_points:,} points")
+
+    # Drawdown (min/max bucket: ไม่ทำให้จุดต่ำสุดหายไปตอนย่อ)
+    fig_dd = go.Figure(go.Scatter(x=df_drawdown['Timestamp'], y=-df_drawdown['Drawdown_%'], mode='lines',
+                                  name='Drawdown %', line=dict(color='#ff00aa', width=1.5),
+                                  fill='tozeroy', fillcolor='rgba(255, 0, 170, 0.1)'))
+    fig_dd.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                         font=dict(color='#e0e0e0', family="Courier New"),
+                         xaxis=dict(showgrid=False, color='#bd00ff'),
+                         yaxis=dict(showgrid=True, gridcolor='rgba(50,50,50,0.5)', color='#bd00ff', ticksuffix='%'),
+                         margin=dict(l=0, r=0, t=10, b=0), height=180)
+    st.plotly_chart(fig_dd, use_container_width=True)
+
+    # สรุปรายวัน / รายสัปดาห์ (pre-aggregated ตอนโหลดแถวใหม่ ไม่ต้องคำนวณใหม่ทุกครั้ง)
+    with st.expander("📅 Daily / Weekly"):
+        freq = st.radio("Period", ["D", "W"], format_func=lambda f: "Daily" if f == "D" else "Weekly", horizontal=True)
+        df_period = data.period_frame(freq)
+        fig_p = go.Figure(go.Bar(x=df_period['Period'], y=df_period['Balance_Close'], name='Close',
+                                 marker_color='#00f2ff', customdata=df_period[['Max_Drawdown_%', 'Trades']],
+                                 hovertemplate="%{x}<br>Close %{y:.2f}<br>Max DD %{customdata[0]:.2f}%<br>Trades %{customdata[1]}"))
+        fig_p.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='#e0e0e0', family="Courier New"), margin=dict(l=0, r=0, t=10, b=0), height=250)
+        st.plotly_chart(fig_p, use_container_width=True)
+
+    # PnL แยกตามเหรียญ
+    df_symbols = data.symbol_frame()
+    fig_sym = px.bar(df_symbols, x='Symbol', y='PnL_USDT', color='PnL_USDT',
+                     color_continuous_scale=['#ff0000', '#bd00ff', '#00ff00'], hover_data=['Trades', 'Win_Rate'])
+    fig_sym.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                          font=dict(color='#e0e0e0', family="Courier New"), coloraxis_showscale=False,
+                          margin=dict(l=0, r=0, t=30, b=0), height=250)
+    st.plotly_chart(fig_sym, use_container_width=True)
 
 # --- Tables Section ---
 col_active, col_hist = st.columns([1, 1.5])
@@ -195,25 +244,32 @@ col_active, col_hist = st.columns([1, 1.5])
 with col_active:
     st.markdown("### 🟢 Active Positions")
     if not df_active.empty:
-        # แต่งตาราง Active
+        # ราคาปัจจุบันจาก cache กลาง (render ไม่เคยเรียก exchange เอง)
+        prices = get_price_cache()
+        prices.watch(df_active['Symbol'])
+        df_live = mark_positions(df_active, prices.get, LEVERAGE)
         st.dataframe(
-            df_active[['Symbol', 'Side', 'Entry', 'Current_SL', 'Margin_Size']],
+            df_live[['Symbol', 'Side', 'Entry', 'Price', 'ROE_%', 'PnL_USDT', 'Current_SL', 'SL_Distance_%', 'Margin_Size']],
             use_container_width=True,
-            hide_index=True
+            hide_index=True,
+            column_config={
+                "PnL_USDT": st.column_config.NumberColumn("uPnL ($)", format="$%.2f"),
+                "ROE_%": st.column_config.NumberColumn("ROE %", format="%+.2f"),
+                "SL_Distance_%": st.column_config.NumberColumn("To SL %", format="%.2f"),
+            }
         )
+        age = prices.age()
+        if prices.error: st.caption(f"⚠️ Price feed: {prices.error}")
+        elif age is None: st.caption("⏳ Loading prices...")
+        else: st.caption(f"Prices {age:.0f}s old | unrealized PnL {df_live['PnL_USDT'].sum():+.2f} USDT")
     else:
         st.info("💤 No active trades. Bot is scanning...")
 
 with col_hist:
     st.markdown("### 📜 Trade History")
-    if not df_history.empty:
-        # คัดมาแค่ 10 ไม้ล่าสุด
-        recent_history = df_history.tail(10).sort_values('Timestamp', ascending=False)
-        
-        # ฟังก์ชันใส่สีให้ตาราง
-        def highlight_win_loss(val):
-            color = '#00ff00' if val == 'WIN' else '#ff0000'
-            return f'color: {color}; font-weight: bold'
+    if has_history:
+        # 10 ไม้ล่าสุด (ใหม่สุดอยู่บน)
+        recent_history = data.recent_frame()
 
         st.dataframe(
             recent_history[['Timestamp', 'Symbol', 'Side', 'PnL_USDT', 'Result']],
@@ -227,6 +283,10 @@ with col_hist:
         st.info("No trade history yet.")
 
 # --- Manual Refresh Button ---
+if data:
+    # one shared loader: reads grow with time, not with the number of viewers
+    st.caption(f"Sheet data {datetime.now().timestamp() - data.fetched_at:.0f}s old | "
+               f"{data.api_calls:,} sheet reads since start")
 if st.button('🔄 Refresh Data'):
-    st.cache_data.clear()
+    if data: data.refresh(force=True)
     st.rerun()
@@ -0,0 +1,243 @@
+import time
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from downsample import lttb, minmax, window
+from strategy import trade_roe, trade_pnl
+
+# ==========================================
+# 🗄️ DASHBOARD DATA SERVICE (incremental, shared by every session)
+# ==========================================
+# One instance lives in st.cache_resource. refresh() makes a single
+# values_batch_get call that returns the balance, the (small) active table and
+# only the trade_history rows appended since the last refresh, then folds
+# those rows into running aggregates. Page renders read the aggregates, so
+# their cost does not grow with the size of the history.
+# The bot appends history in close order, so rows arrive already sorted.
+HISTORY_WIDTH = 'J'        # Symbol .. Timestamp
+SHEETS_EPOCH = datetime(1899, 12, 30)
+
+def _num(value):
+    try: return float(value)
+    except (TypeError, ValueError): return float('nan')
+
+def _time(value):
+    # naive timestamps are treated as UTC (pd.Timestamp.timestamp), whatever the server's timezone
+    if isinstance(value, (int, float)): return pd.Timestamp(SHEETS_EPOCH + timedelta(days=value))   # serial date cell
+    try: return pd.Timestamp(value)
+    except (TypeError, ValueError): return None
+
+def mark_positions(active, price_of, leverage):
+    """Active trades + current price, unrealized ROE / PnL (same formula as close_trade) and
+    distance to SL in % of price (positive = room left before the stop)."""
+    rows = []
+    for rec in active.to_dict('records'):
+        side, entry, sl = rec.get('Side'), _num(rec.get('Entry')), _num(rec.get('Current_SL'))
+        price = price_of(rec.get('Symbol'))
+        price = float('nan') if price is None else price
+        roe = trade_roe(side, entry, price, leverage) if entry else float('nan')
+        dist = (price - sl) / price * 100 if side == 'LONG' else (sl - price) / price * 100
+        rows.append({**rec, 'Price': price, 'ROE_%': roe, 'PnL_USDT': trade_pnl(_num(rec.get('Margin_Size')), roe),
+                     'SL_Distance_%': dist})
+    return pd.DataFrame(rows)
+
+class _Series:
+    """Append-only float64 columns with amortized O(1) growth; views are zero-copy."""
+
+    def __init__(self, names, capacity=1024):
+        self.n = 0
+        self.cols = {k: np.empty(capacity) for k in names}
+
+    def append(self, **values):
+        if self.n == len(next(iter(self.cols.values()))):
+            for k, v in self.cols.items():
+                grown = np.empty(len(v) * 2)
+                grown[:self.n] = v[:self.n]
+                self.cols[k] = grown
+        for k, v in values.items(): self.cols[k][self.n] = v
+        self.n += 1
+
+    def __getitem__(self, name):
+        return self.cols[name][:self.n]
+
+class _Periods:
+    """Close / low / max drawdown per calendar period, updated as rows arrive (rows are time ordered)."""
+
+    def __init__(self, key):
+        self.key = key                 # epoch seconds -> period start (epoch seconds)
+        self.start, self.close, self.low, self.max_dd, self.trades = [], [], [], [], []
+
+    def add(self, t, balance, dd):
+        k = self.key(t)
+        if self.start and self.start[-1] == k:
+            self.close[-1] = balance
+            self.low[-1] = min(self.low[-1], balance)
+            self.max_dd[-1] = max(self.max_dd[-1], dd)
+            self.trades[-1] += 1
+            return
+        self.start.append(k); self.close.append(balance); self.low.append(balance)
+        self.max_dd.append(dd); self.trades.append(1)
+
+    def frame(self):
+        return pd.DataFrame({'Period': pd.to_datetime(self.start, unit='s'), 'Balance_Close': self.close,
+                             'Balance_Low': self.low, 'Max_Drawdown_%': self.max_dd, 'Trades': self.trades})
+
+DAY = 86_400
+def _day(t): return t // DAY * DAY
+def _week(t): return (t // DAY + 3) // 7 * 7 * DAY - 3 * DAY   # weeks start on Monday (1970-01-01 was a Thursday)
+
+class DashboardData:
+    def __init__(self, sheet, initial_balance=200.0, ttl=60, recent=10):
+        self.sheet = sheet
+        self.initial_balance = initial_balance
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._recent_n = recent
+        self.fetched_at = 0.0
+        self.api_calls = 0
+        self._reset()
+
+    def _reset(self):
+        self.header = None
+        self.next_row = 2              # sheet row of the first trade_history record not read yet
+        self._last_row = None          # raw values of row next_row - 1, to detect a rewritten sheet
+        self.trades = 0
+        self.balance = 0.0
+        self.active = pd.DataFrame()
+        self.wins = 0
+        self.peak = self.initial_balance
+        self.max_drawdown_pct = 0.0
+        self.by_symbol = {}            # symbol -> [pnl, trades, wins]
+        self.equity = _Series(['t', 'balance', 'drawdown_pct'])
+        self.periods = {'D': _Periods(_day), 'W': _Periods(_week)}
+        self.recent = deque(maxlen=self._recent_n)
+        self._view = (None, None)
+
+    # ---------- loading ----------
+    def _fetch(self):
+        ranges = ['summary!B1', 'active_trades!A1:G', f"trade_history!A{self.next_row - 1}:{HISTORY_WIDTH}"]
+        res = self.sheet.values_batch_get(ranges, params={'valueRenderOption': 'UNFORMATTED_VALUE'})
+        self.api_calls += 1
+        return [r.get('values', []) for r in res['valueRanges']]
+
+    def refresh(self, force=False):
+        """Fetch what changed since the last call (at most once per ttl unless forced)."""
+        with self._lock:
+            if not force and time.time() - self.fetched_at < self.ttl: return False
+            summary, active, history = self._fetch()
+            if self._last_row is not None and (not history or history[0] != self._last_row):
+                # rows were deleted or rewritten: the offsets are meaningless, start over
+                print("♻️ trade_history changed underneath us, reloading")
+                self._reset()
+                summary, active, history = self._fetch()
+            self.balance = _num(summary[0][0]) if summary and summary[0] else 0.0
+            self.active = pd.DataFrame([r + [''] * (len(active[0]) - len(r)) for r in active[1:]],
+                                       columns=active[0]) if active else pd.DataFrame()
+            if history:
+                if self.header is None: self.header = history[0]
+                self._fold(history[1:])
+                self.next_row += len(history) - 1
+                self._last_row = history[-1]
+            self.fetched_at = time.time()
+            return True
+
+    def _fold(self, rows):
+        for row in rows:
+            if not any(v != '' for v in row): continue
+            rec = dict(zip(self.header, list(row) + [''] * (len(self.header) - len(row))))
+            pnl = _num(rec.get('PnL_USDT'))
+            balance = _num(rec.get('Balance_After'))
+            ts = _time(rec.get('Timestamp'))
+            win = rec.get('Result') == 'WIN'
+
+            self.trades += 1
+            self.wins += win
+            s = self.by_symbol.setdefault(rec.get('Symbol', '?'), [0.0, 0, 0])
+            s[0] += pnl if pnl == pnl else 0.0
+            s[1] += 1
+            s[2] += win
+            if balance == balance:
+                self.peak = max(self.peak, balance)
+                dd = (self.peak - balance) / self.peak * 100 if self.peak else 0.0
+                self.max_drawdown_pct = max(self.max_drawdown_pct, dd)
+                if ts is not None and ts is not pd.NaT:
+                    # the equity series must stay sorted by time for window() / the charts
+                    t = ts.timestamp()
+                    self.equity.append(t=t, balance=balance, drawdown_pct=dd)
+                    for agg in self.periods.values(): agg.add(t, balance, dd)
+            rec['Timestamp'] = ts
+            self.recent.append(rec)
+
+    # ---------- aggregates (O(1) or O(symbols)) ----------
+    @property
+    def win_rate(self):
+        return self.wins / self.trades * 100 if self.trades else 0.0
+
+    def equity_view(self, start=None, end=None, points=1500):
+        """Equity (LTTB) and drawdown (min/max buckets) inside [start, end] epoch seconds,
+        each at most `points` rows whatever the length of the history."""
+        t = self.equity['t']
+        lo, hi = window(t, start, end)
+        key = (lo, hi, points)
+        if self._view[0] == key: return self._view[1]   # same slice as the last render
+        t, bal, dd = t[lo:hi], self.equity['balance'][lo:hi], self.equity['drawdown_pct'][lo:hi]
+        e = lttb(t, bal, points)
+        d = minmax(dd, points)
+        equity = pd.DataFrame({'Timestamp': pd.to_datetime(t[e], unit='s'), 'Balance_After': bal[e]})
+        drawdown = pd.DataFrame({'Timestamp': pd.to_datetime(t[d], unit='s'), 'Drawdown_%': dd[d]})
+        self._view = (key, (equity, drawdown, hi - lo))
+        return self._view[1]
+
+    def period_frame(self, freq='D'):
+        return self.periods[freq].frame()
+
+    def symbol_frame(self):
+        rows = [(k, v[0], v[1], v[2] / v[1] * 100 if v[1] else 0.0) for k, v in self.by_symbol.items()]
+        return pd.DataFrame(rows, columns=['Symbol', 'PnL_USDT', 'Trades', 'Win_Rate']).sort_values('PnL_USDT', ascending=False)
+
+    def recent_frame(self):
+        return pd.DataFrame(list(reversed(self.recent)))
+
+if __name__ == "__main__":
+    # load-time check against an in-memory sheet: first load vs. constant-cost refreshes
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark incremental history loading")
+    parser.add_argument('--trades', type=int, default=100_000)
+    parser.add_argument('--append', type=int, default=5, help="rows appended between refreshes")
+    args = parser.parse_args()
+
+    class MemorySheet:
+        def __init__(self, rows): self.history = rows
+        def values_batch_get(self, ranges, params=None):
+            start = int(ranges[2].split('!A')[1].split(':')[0])
+            return {'valueRanges': [{'values': [[200.0]]}, {'values': [['Symbol', 'Side']]},
+                                    {'values': self.history[start - 1:]}]}
+
+    rng = np.random.default_rng(0)
+    header = ['Symbol', 'Side', 'Entry', 'Exit', 'PnL_USDT', 'ROE%', 'Result', 'Reason', 'Balance_After', 'Timestamp']
+    bal, rows, t0 = 200.0, [header], datetime(2026, 1, 1)
+    def make(i):
+        global bal
+        pnl = float(rng.normal(0, 1))
+        bal += pnl
+        return [f"S{i % 30}/USDT", 'LONG', 1.0, 1.0, pnl, 0.0, 'WIN' if pnl > 0 else 'LOSS', '', bal,
+                str(t0 + timedelta(minutes=5 * i))]
+    rows += [make(i) for i in range(args.trades)]
+    sheet = MemorySheet(rows)
+    data = DashboardData(sheet, ttl=0)
+
+    started = time.perf_counter(); data.refresh()
+    print(f"📥 first load: {data.trades:,} trades in {time.perf_counter() - started:.2f}s")
+    for k in range(3):
+        rows += [make(args.trades + k * args.append + j) for j in range(args.append)]
+        started = time.perf_counter(); data.refresh()
+        print(f"🔁 refresh +{args.append} rows: {(time.perf_counter() - started) * 1000:.2f} ms "
+              f"| win rate {data.win_rate:.1f}% | max DD {data.max_drawdown_pct:.2f}%")
+    started = time.perf_counter(); equity, drawdown, raw = data.equity_view(points=1500)
+    print(f"📉 equity view: {raw:,} points -> {len(equity)} / {len(drawdown)} in {(time.perf_counter() - started) * 1000:.1f} ms"
+          f" | {len(data.period_frame('D'))} days, {len(data.period_frame('W'))} weeks")
+    full = pd.DataFrame(rows[1:], columns=header)
+    assert data.trades == len(full) and abs(data.equity['balance'][-1] - full['Balance_After'].iloc[-1]) < 1e-9
+    print("✅ aggregates match a full reload")
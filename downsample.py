@@ -0,0 +1,49 @@
+import numpy as np
+
+# ==========================================
+# 📉 CHART DOWNSAMPLING (bounded payload for Plotly)
+# ==========================================
+# Both functions return indices into the input, so any other column (time,
+# drawdown, hover text) can be picked with the same selection. Inputs must be
+# sorted by x.
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keeps the visual shape of a line with n_out points."""
+    n = len(x)
+    if n_out >= n or n_out < 3: return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # points 1..n-2 are split into n_out-2 buckets; first and last points are always kept
+    edges = (np.floor(np.arange(n_out - 1) * ((n - 2) / (n_out - 2))) + 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+def minmax(y, n_out):
+    """Min and max of each of n_out/2 equal buckets (keeps every spike, e.g. drawdown troughs)."""
+    n = len(y)
+    if n_out >= n or n_out < 4: return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    buckets = n_out // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picks = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo: continue
+        seg = y[lo:hi]
+        picks += [lo + int(np.nanargmin(seg)) if not np.isnan(seg).all() else lo,
+                  lo + int(np.nanargmax(seg)) if not np.isnan(seg).all() else hi - 1]
+    return np.unique(picks)
+
+def window(x, start=None, end=None):
+    """Index range [lo, hi) of the sorted array x that falls inside [start, end]."""
+    lo = 0 if start is None else int(np.searchsorted(x, start, side='left'))
+    hi = len(x) if end is None else int(np.searchsorted(x, end, side='right'))
+    return lo, hi
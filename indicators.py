@@ -0,0 +1,249 @@
+import os
+import json
+import math
+import numpy as np
+from candle_store import timeframe_ms
+from ring import RingBuffer
+
+# ==========================================
+# 📈 STREAMING INDICATORS (O(1) update per closed bar)
+# ==========================================
+# Same definitions as calculate_indicators() in main.py (ta library):
+#   ema200 -> ewm(span=200, adjust=False)      rsi7 -> Wilder ewm(alpha=1/7)
+#   adx    -> Wilder-smoothed TR/+DM/-DM (14)  vol_ma -> 20-bar mean
+#   vwap   -> 288-bar sum(typical*vol) / sum(vol)
+EMA_WINDOW = 200
+ADX_WINDOW = 14
+RSI_WINDOW = 7
+VOL_MA_WINDOW = 20
+VWAP_WINDOW = 288
+
+NAN = float('nan')
+PARITY_TOL = 1e-6          # max relative error vs calculate_indicators() (python indicators.py)
+
+class RollingSum:
+    """Fixed window running sum; re-summed once per wrap to cancel float drift.
+
+    The window is stored as float32 (half the memory); the total is kept in
+    float64 over exactly the stored values, which keeps vol_ma / vwap within
+    ~2e-8 of ta (PARITY_TOL is 1e-6).
+    """
+    __slots__ = ('window', 'values', 'total', 'since_resum')
+
+    def __init__(self, window, values=()):
+        self.window = window
+        self.values = RingBuffer(window, dtype=np.float32, values=values)
+        self.total = math.fsum(self.values.view())
+        self.since_resum = 0
+
+    def push(self, x):
+        x = float(np.float32(x))       # add what the window will hold, so re-sums agree
+        if self.values.full: self.total -= float(self.values.oldest())
+        self.values.append(x)
+        self.total += x
+        self.since_resum += 1
+        if self.since_resum >= self.window:
+            self.total = math.fsum(self.values.view())
+            self.since_resum = 0
+
+    @property
+    def full(self):
+        return self.values.full
+
+class IndicatorState:
+    """Rolling indicator state for one symbol/timeframe."""
+    __slots__ = ('last_ts', 'bar', 'n', 'ema', 'rsi_up', 'rsi_dn', 'tr_s', 'pdm_s', 'ndm_s', 'dx_sum', 'adx',
+                 'vol', 'pv', 'pv_vol')
+
+    def __init__(self):
+        self.last_ts = None
+        self.bar = None                         # last closed [ts, o, h, l, c, v]
+        self.n = 0                              # closed bars seen
+        self.ema = NAN
+        self.rsi_up = self.rsi_dn = 0.0
+        self.tr_s = self.pdm_s = self.ndm_s = 0.0
+        self.dx_sum = 0.0
+        self.adx = NAN
+        self.vol = RollingSum(VOL_MA_WINDOW)
+        self.pv = RollingSum(VWAP_WINDOW)
+        self.pv_vol = RollingSum(VWAP_WINDOW)
+
+    def update(self, ts, o, h, l, c, v):
+        prev = self.bar
+        n = self.n
+
+        # EMA
+        a = 2.0 / (EMA_WINDOW + 1)
+        self.ema = c if n == 0 else a * c + (1 - a) * self.ema
+
+        if prev is not None:
+            ph, pl, pc = prev[2], prev[3], prev[4]
+
+            # RSI (first bar contributes a zero gain/loss, exactly like ta)
+            diff = c - pc
+            a = 1.0 / RSI_WINDOW
+            self.rsi_up = a * max(diff, 0.0) + (1 - a) * self.rsi_up
+            self.rsi_dn = a * max(-diff, 0.0) + (1 - a) * self.rsi_dn
+
+            # ADX: k counts TR samples, the first Wilder sum covers k = 1..w
+            k, w = n, ADX_WINDOW
+            tr = max(h, pc) - min(l, pc)
+            up, dn = h - ph, pl - l
+            pdm = up if (up > dn and up > 0) else 0.0
+            ndm = dn if (dn > up and dn > 0) else 0.0
+            if k <= w:
+                self.tr_s += tr
+                self.pdm_s += pdm
+                self.ndm_s += ndm
+            else:
+                self.tr_s += tr - self.tr_s / w
+                self.pdm_s += pdm - self.pdm_s / w
+                self.ndm_s += ndm - self.ndm_s / w
+            if k >= w:
+                dip = 100 * self.pdm_s / self.tr_s if self.tr_s else 0.0
+                din = 100 * self.ndm_s / self.tr_s if self.tr_s else 0.0
+                dx = 100 * abs(dip - din) / (dip + din) if dip + din else 0.0
+                if k < 2 * w - 1:
+                    self.dx_sum += dx
+                elif k == 2 * w - 1:
+                    self.adx = (self.dx_sum + dx) / w
+                else:
+                    self.adx = (self.adx * (w - 1) + dx) / w
+
+        self.vol.push(v)
+        self.pv.push((h + l + c) / 3.0 * v)
+        self.pv_vol.push(v)
+
+        self.bar = [ts, o, h, l, c, v]
+        self.last_ts = ts
+        self.n = n + 1
+
+    def snapshot(self):
+        """Indicator values on the last closed bar, keyed like the DataFrame columns."""
+        if self.bar is None: return None
+        ts, o, h, l, c, v = self.bar
+        if self.n < RSI_WINDOW: rsi = NAN
+        elif self.rsi_dn == 0: rsi = 100.0
+        else: rsi = 100 - 100 / (1 + self.rsi_up / self.rsi_dn)
+        return {
+            'timestamp': ts, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v,
+            'ema200': self.ema if self.n >= EMA_WINDOW else NAN,
+            'adx': self.adx,
+            'vol_ma': self.vol.total / VOL_MA_WINDOW if self.vol.full else NAN,
+            'vwap': self.pv.total / self.pv_vol.total if self.pv.full and self.pv_vol.total else NAN,
+            'rsi7': rsi,
+        }
+
+    def to_dict(self):
+        d = {k: getattr(self, k) for k in self.__slots__}
+        d.update({k: v.values.view().tolist() for k, v in d.items() if isinstance(v, RollingSum)})
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls()
+        for k, v in d.items():
+            if isinstance(getattr(state, k, None), RollingSum):
+                setattr(state, k, RollingSum(getattr(state, k).window, v))
+            else:
+                setattr(state, k, v)
+        return state
+
+class IndicatorEngine:
+    """Keeps one IndicatorState per symbol and persists it between runs as JSON."""
+
+    def __init__(self, root='data/indicators', timeframe='5m'):
+        self.root = root
+        self.timeframe = timeframe
+        self.tf_ms = timeframe_ms(timeframe)
+        self.states = {}
+
+    def path(self, symbol):
+        name = symbol.replace('/', '').replace(':', '_')
+        return os.path.join(self.root, f"{name}_{self.timeframe}.json")
+
+    def state(self, symbol):
+        if symbol not in self.states:
+            try:
+                with open(self.path(symbol)) as f:
+                    self.states[symbol] = IndicatorState.from_dict(json.load(f))
+            except (OSError, ValueError):
+                self.states[symbol] = IndicatorState()
+        return self.states[symbol]
+
+    def save(self, symbol):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path(symbol) + '.tmp'
+        with open(tmp, 'w') as f: json.dump(self.states[symbol].to_dict(), f)
+        os.replace(tmp, self.path(symbol))
+
+    def update(self, symbol, df, now_ms):
+        """Feed closed bars of `df` newer than the stored state; return the last closed row."""
+        closed = df[df['timestamp'] + self.tf_ms <= now_ms]
+        if closed.empty: return self.state(symbol).snapshot()
+        rows = closed[['timestamp', 'open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+        return self.feed(symbol, lambda after: rows if after is None else rows[rows[:, 0] > after])
+
+    def feed(self, symbol, bars_after):
+        """Same as update() without a DataFrame: bars_after(ts) returns closed (n x 6) bars newer
+        than ts, or all of them for None (e.g. BarBuilder.closed_after)."""
+        state = self.state(symbol)
+        new = bars_after(state.last_ts)
+        # a hole between the saved state and the bars means the state is stale: rebuild it
+        if state.last_ts is not None and len(new) and new[0, 0] != state.last_ts + self.tf_ms:
+            state = self.states[symbol] = IndicatorState()
+            new = bars_after(None)
+
+        if len(new):
+            for ts, o, h, l, c, v in new.tolist():
+                state.update(int(ts), o, h, l, c, v)
+            self.save(symbol)
+        return state.snapshot()
+
+def verify_parity(df, reference):
+    """Replay `df` bar by bar and compare against reference(df) (e.g. calculate_indicators).
+
+    Every row is compared, including the last closed bar the live scanner reads; warm-up
+    rows where either side is undefined are skipped. Returns {column: max relative error}.
+    """
+    ref = reference(df.copy())
+    state = IndicatorState()
+    rows = []
+    for ts, o, h, l, c, v in df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+        state.update(int(ts), float(o), float(h), float(l), float(c), float(v))
+        rows.append(state.snapshot())
+
+    errors = {}
+    for col in ('ema200', 'adx', 'vol_ma', 'vwap', 'rsi7'):
+        worst = 0.0
+        for i in range(len(rows)):
+            got, want = rows[i][col], float(ref[col].iloc[i])
+            if math.isnan(got) or math.isnan(want): continue
+            worst = max(worst, abs(got - want) / max(abs(want), 1e-12))
+        errors[col] = worst
+    return errors
+
+if __name__ == "__main__":
+    # Parity check on recorded candles: python indicators.py data/candles/BTCUSDT_5m.bin
+    # (no file given: random-walk fixtures from backtest.synthetic_candles)
+    import sys
+    import pandas as pd
+    from candle_store import RECORD, COLUMNS
+    from main import calculate_indicators
+    from backtest import synthetic_candles
+
+    cases = []
+    for path in sys.argv[1:]:
+        if path.endswith('.csv'): cases.append((path, pd.read_csv(path)[COLUMNS]))
+        else: cases.append((path, pd.DataFrame(np.fromfile(path, dtype=RECORD), columns=COLUMNS)))
+    if not cases:
+        cases = [(f"synthetic seed {seed}", synthetic_candles(3000, '5m', seed=seed)) for seed in range(3)]
+
+    failed = False
+    for name, df in cases:
+        errors = verify_parity(df, calculate_indicators)
+        # a file shorter than the longest window would leave vwap uncompared
+        ok = len(df) > VWAP_WINDOW and all(e <= PARITY_TOL for e in errors.values())
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {name} ({len(df)} bars) " + " ".join(f"{k}={e:.1e}" for k, e in errors.items()))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,286 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sheet_journal import SheetJournal, ACTIVE_HEADER
+
+# ==========================================
+# 🧾 LOCAL LEDGER (SQLite, source of truth)
+# ==========================================
+HISTORY_COLUMNS = ['Symbol', 'Side', 'Entry', 'Exit', 'PnL_USDT', 'ROE%', 'Result', 'Reason', 'Balance_After', 'Timestamp']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS active_trades (
+    symbol TEXT PRIMARY KEY, side TEXT NOT NULL, entry REAL NOT NULL, current_sl REAL NOT NULL,
+    trailing_step INTEGER NOT NULL, margin_size REAL NOT NULL, timestamp TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS trade_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, side TEXT, entry REAL, exit REAL,
+    pnl_usdt REAL, roe REAL, result TEXT, reason TEXT, balance_after REAL, timestamp TEXT,
+    synced INTEGER NOT NULL DEFAULT 0);   -- 0 = not on the sheet, 2 = append sent (unconfirmed), 1 = on the sheet
+CREATE TABLE IF NOT EXISTS stop_orders (
+    symbol TEXT PRIMARY KEY, client_id TEXT NOT NULL, order_id TEXT NOT NULL, sl REAL NOT NULL, step INTEGER NOT NULL);
+"""
+
+class Position:
+    """One open trade; plain attributes instead of a DataFrame row (no per-row Series boxing)."""
+    __slots__ = ('symbol', 'side', 'entry', 'current_sl', 'trailing_step', 'margin_size', 'timestamp')
+
+    def __init__(self, symbol, side, entry, current_sl, trailing_step, margin_size, timestamp):
+        self.symbol = symbol
+        self.side = side
+        self.entry = float(entry)
+        self.current_sl = float(current_sl)
+        self.trailing_step = int(trailing_step)
+        self.margin_size = float(margin_size)
+        self.timestamp = timestamp
+
+class Ledger:
+    """Balance, open positions and closed trades with transactional updates.
+
+    Every mutation bumps `version`; the sheet mirror stores the version it last
+    pushed in summary!B2 so a stale local copy can be detected on start.
+    """
+
+    def __init__(self, path='data/ledger.db'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock: self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("INSERT INTO meta VALUES ('version', '1') "
+                                  "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+                self.conn.execute("COMMIT")
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _meta(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # ---------- reads ----------
+    def is_empty(self):
+        return self._meta('balance') is None
+
+    def version(self):
+        return int(self._meta('version') or 0)
+
+    def balance(self):
+        value = self._meta('balance')
+        if value is None: raise RuntimeError("ledger has no balance yet (bootstrap it first)")
+        return float(value)
+
+    def active_trades(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT symbol, side, entry, current_sl, trailing_step, margin_size, timestamp "
+                                     "FROM active_trades ORDER BY timestamp").fetchall()
+        return [dict(zip(ACTIVE_HEADER, r)) for r in rows]
+
+    def positions(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT symbol, side, entry, current_sl, trailing_step, margin_size, timestamp "
+                                     "FROM active_trades ORDER BY timestamp").fetchall()
+        return [Position(*r) for r in rows]
+
+    def stop_orders(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT symbol, client_id, order_id, sl, step FROM stop_orders").fetchall()
+        return {r[0]: {'client_id': r[1], 'order_id': r[2], 'sl': r[3], 'step': r[4]} for r in rows}
+
+    # ---------- writes ----------
+    def bootstrap(self, balance, active, history, version=0):
+        """Replace the ledger with a copy of the sheet (records keyed like the sheet headers)."""
+        with self.transaction() as db:
+            # continue from the sheet's version so the copy is not seen as stale again
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(int(version)),))
+            db.execute("DELETE FROM active_trades")
+            db.execute("DELETE FROM trade_history")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('balance', ?)", (repr(float(balance)),))
+            db.executemany("INSERT OR REPLACE INTO active_trades VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [tuple(r[k] for k in ACTIVE_HEADER) for r in active])
+            db.executemany("INSERT INTO trade_history (symbol, side, entry, exit, pnl_usdt, roe, result, reason, "
+                           "balance_after, timestamp, synced) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                           [tuple(r[k] for k in HISTORY_COLUMNS) for r in history])
+
+    def open_trade(self, symbol, side, entry, sl, margin_size, timestamp):
+        with self.transaction() as db:
+            db.execute("INSERT INTO active_trades VALUES (?, ?, ?, ?, 0, ?, ?)",
+                       (symbol, side, float(entry), float(sl), float(margin_size), timestamp))
+
+    def update_sl(self, symbol, new_sl, new_step):
+        # steps only move forward: the cycle and the tick watcher may both try to trail
+        with self.transaction() as db:
+            cur = db.execute("UPDATE active_trades SET current_sl = ?, trailing_step = ? "
+                             "WHERE symbol = ? AND trailing_step < ?",
+                             (float(new_sl), int(new_step), symbol, int(new_step)))
+            return cur.rowcount > 0
+
+    # exchange stop bookkeeping (stop_orders.py): not mirrored, so no version bump
+    def save_stop(self, symbol, client_id, order_id, sl, step):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO stop_orders VALUES (?, ?, ?, ?, ?)",
+                              (symbol, client_id, str(order_id), float(sl), int(step)))
+
+    def drop_stop(self, symbol):
+        with self._lock:
+            self.conn.execute("DELETE FROM stop_orders WHERE symbol = ?", (symbol,))
+
+    def close_trade(self, symbol, exit_price, pnl_usdt, roe, reason, timestamp):
+        """Book the exit, move the trade to history and credit the balance atomically.
+
+        Returns the new balance, or None when the symbol has no open trade.
+        """
+        with self.transaction() as db:
+            trade = db.execute("SELECT side, entry FROM active_trades WHERE symbol = ?", (symbol,)).fetchone()
+            if trade is None: return None
+            balance = float(db.execute("SELECT value FROM meta WHERE key = 'balance'").fetchone()[0]) + float(pnl_usdt)
+            result = "WIN" if pnl_usdt > 0 else "LOSS"
+            db.execute("UPDATE meta SET value = ? WHERE key = 'balance'", (repr(balance),))
+            db.execute("INSERT INTO trade_history (symbol, side, entry, exit, pnl_usdt, roe, result, reason, "
+                       "balance_after, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (symbol, trade[0], trade[1], float(exit_price), float(pnl_usdt), float(roe),
+                        result, reason, balance, timestamp))
+            db.execute("DELETE FROM active_trades WHERE symbol = ?", (symbol,))
+            return balance
+
+    # ---------- mirror support ----------
+    def unsynced_history(self):
+        with self._lock:
+            return self.conn.execute("SELECT id, symbol, side, entry, exit, pnl_usdt, roe, result, reason, "
+                                     "balance_after, timestamp FROM trade_history WHERE synced != 1 ORDER BY id").fetchall()
+
+    def in_flight(self):
+        """(id, symbol, timestamp) of the last row of an append that was sent but never confirmed, or None."""
+        with self._lock:
+            return self.conn.execute("SELECT id, symbol, timestamp FROM trade_history WHERE synced = 2 "
+                                     "ORDER BY id DESC LIMIT 1").fetchone()
+
+    def mark_in_flight(self, last_id):
+        # bookkeeping only: set before append_rows so a crash / timeout mid-append is detectable
+        with self._lock:
+            self.conn.execute("UPDATE trade_history SET synced = 2 WHERE id <= ? AND synced = 0", (last_id,))
+
+    def mark_synced(self, last_id):
+        # bookkeeping only: does not bump the version
+        with self._lock:
+            self.conn.execute("UPDATE trade_history SET synced = 1 WHERE id <= ?", (last_id,))
+
+class SheetMirror:
+    """Copies the ledger to the existing sheet layout from a background thread.
+
+    History rows are the only non-idempotent write: they are flagged in flight before
+    append_rows and synced right after, and a batch left in flight by a crash or timeout
+    is looked up on the sheet before it is sent again. Balance and active_trades are
+    full snapshots.
+    """
+
+    def __init__(self, ledger, connect, interval=30):
+        self.ledger = ledger
+        self.connect = connect
+        self.interval = interval
+        self.journal = None
+        self.pushed_version = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _journal(self):
+        if self.journal is None:
+            self.journal = SheetJournal(self.connect())
+        return self.journal
+
+    def load_sheet(self):
+        """Read (balance, version, active records, history records) from the sheet."""
+        j = self._journal()
+        j.refresh()
+        b1, b2 = (j.worksheet('summary').get('B1:B2') + [[], []])[:2]
+        balance = float(b1[0]) if b1 and b1[0] != '' else None
+        version = int(float(b2[0])) if b2 and b2[0] != '' else 0
+        history = j.worksheet('trade_history').get_all_records()
+        return balance, version, j.active_records(), history
+
+    def reconcile(self, initial_balance):
+        """Seed the ledger from the sheet when it is empty or older than the last mirror."""
+        if not self.ledger.is_empty():
+            try:
+                sheet_version = self._sheet_version()
+            except Exception as e:
+                print(f"⚠️ Sheet unreachable, trading from local ledger: {e}")
+                return
+            if sheet_version == self.ledger.version(): self.pushed_version = sheet_version
+            if sheet_version <= self.ledger.version(): return
+            print(f"♻️ Local ledger is stale (v{self.ledger.version()} < sheet v{sheet_version}), reloading")
+        balance, version, active, history = self.load_sheet()
+        self.ledger.bootstrap(initial_balance if balance is None else balance, active, history, version)
+        print(f"📥 Ledger loaded from sheet: {len(active)} open / {len(history)} closed")
+
+    def _sheet_version(self):
+        b2 = self._journal().worksheet('summary').get('B2')
+        return int(float(b2[0][0])) if b2 and b2[0] and b2[0][0] != '' else 0
+
+    def sync_once(self):
+        if self.ledger.is_empty(): return
+        version = self.ledger.version()
+        history = self.ledger.unsynced_history()
+        if version == self.pushed_version and not history: return
+        j = self._journal()
+        if j.active is None: j.refresh()  # row count is needed to blank closed rows
+        if history:
+            sent = self.ledger.in_flight()
+            if sent is not None and self._on_sheet(j, sent[1], sent[2]):
+                # the last append landed but was never confirmed: do not send it twice
+                self.ledger.mark_synced(sent[0])
+                history = [r for r in history if r[0] > sent[0]]
+        if history:
+            self.ledger.mark_in_flight(history[-1][0])
+            for row in history: j.add_history(row[1:])
+            j.flush()
+            self.ledger.mark_synced(history[-1][0])
+        j.set_balance(self.ledger.balance(), version)
+        j.set_active([[r[k] for k in ACTIVE_HEADER] for r in self.ledger.active_trades()])
+        j.flush()
+        self.pushed_version = version
+
+    def _on_sheet(self, j, symbol, timestamp):
+        # append_rows is one request, so the batch landed whole or not at all: check its last row
+        rows = j.worksheet('trade_history').get_all_values()
+        if len(rows) < 2: return False
+        last = dict(zip(rows[0], rows[-1]))
+        return last.get('Symbol') == symbol and str(last.get('Timestamp')) == str(timestamp)
+
+    def nudge(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try: self.sync_once()
+            except Exception as e:
+                print(f"⚠️ Sheet mirror failed, will retry: {e}")
+                self.journal = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sheet-mirror', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        self._stop.set()
+        self._wake.set()
+        if self._thread: self._thread.join(timeout)
+        try: self.sync_once()
+        except Exception as e: print(f"⚠️ Final sheet mirror failed: {e}")
@@ -1,5 +1,6 @@
 import ccxt
 import pandas as pd
+import numpy as np
 import ta
 import time
 import gspread
@@ -7,7 +8,22 @@ from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timezone
 import json
 import os
-import requests
+import threading
+import asyncio
+import signal
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from candle_store import CandleStore, timeframe_ms
+from indicators import IndicatorEngine
+from scanner import scan_panel, evaluate_signals
+from screener import UniverseScreener
+from ledger import Ledger, SheetMirror
+from strategy import in_session, initial_sl, sl_hit, trail_update, trade_roe, trade_pnl, htf_filter
+from resample import MultiTimeframe, ema
+from price_feed import PriceFeed, PositionWatcher, OKX_PUBLIC_WS
+from notifier import DiscordNotifier
+from metrics import Metrics, profile_call
+from stop_orders import StopOrders
 
 # ==========================================
 # ⚙️ CONFIGURATION & SECRETS
@@ -15,14 +31,20 @@ import requests
 SYMBOLS = ['DOGE/USDT', 'ETH/USDT', 'BTC/USDT', 'BNB/USDT', 'XRP/USDT']
 TIMEFRAME = '5m'
 SHEET_NAME = 'CryptoBot_TEST_TF5MIN'
+LEDGER_PATH = 'data/ledger.db'
 
 # 💰 Money Management Settings
+INITIAL_BALANCE = 200.0       # ใช้เมื่อชีตยังไม่มียอดเงิน (summary!B1 ว่าง)
 PCT_BALANCE_PER_TRADE = 0.10  # 👈 ใช้เงิน 10% ของยอดคงเหลือ (เริ่ม 200$ = 20$)
 LEVERAGE = 10
 
 # ⚙️ Strategy Settings
 INITIAL_SL_ROE = 0.10      # เริ่มต้น SL ที่ -10% ROE
 TRAILING_STEP_ROE = 0.15   # ขยับ SL ทุกๆ กำไร 15% ROE
+RSI_LONG = 40              # LONG เมื่อ RSI7 ต่ำกว่านี้
+RSI_SHORT = 60             # SHORT เมื่อ RSI7 สูงกว่านี้
+ADX_MIN = 25               # ADX ต้องมากกว่านี้ถึงนับว่าเทรนด์แรง
+VOL_MULT = 1.2             # Volume ต้องมากกว่า vol_ma x เท่านี้
 
 # ⏰ Time Filter (UTC 07:00 - 22:00)
 START_HOUR_UTC = 0
@@ -31,8 +53,77 @@ END_HOUR_UTC = 24
 # 🔐 Load Secrets from GitHub Environment
 CREDS_JSON = os.environ.get('GDRIVE_API_CREDENTIALS')
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK')
-
-exchange = ccxt.okx()
+DISCORD_OUTBOX = 'data/discord_outbox.jsonl'   # alert ที่ยังส่งไม่สำเร็จ จะถูกส่งใหม่รอบถัดไป
+
+# 🔎 Scanner Settings
+SCAN_MODE = 'stream'       # 'stream' = incremental state ต่อเหรียญ, 'panel' = คำนวณทุกเหรียญพร้อมกันด้วย NumPy (universe ใหญ่)
+
+# 🌐 Screener Settings (คัดเหรียญจากทั้ง exchange ด้วย fetch_tickers ครั้งเดียว)
+SCREENER_TOP_K = 0         # 0 = ใช้ SYMBOLS คงที่ด้านบน (ค่าเริ่มต้น), >0 = เทรดตาม top-K ของ screener (เปลี่ยนความเสี่ยง/จำนวนเหรียญ)
+# ⚠️ เหรียญใหม่ที่หลุดเข้า universe ต้อง warmup BASE_WARMUP_BARS แท่ง 1m (~3000 = ~31 REST call ต่อเหรียญ):
+#    top 30 ตอน cold start / universe หมุนทั้งชุด = ~900 call ในรอบนั้น
+SCREENER_REFRESH_SEC = 3600
+MIN_QUOTE_VOLUME = 1_000_000   # USDT ต่อ 24 ชม.
+UNIVERSE_PATH = 'data/universe.json'
+
+# ♾️ Daemon Settings
+CLOSE_DELAY_SEC = 2        # รอให้ exchange ปิดแท่งให้เรียบร้อยก่อนเริ่มรอบ
+PRICE_FEED_URL = os.environ.get('OKX_WS_URL', OKX_PUBLIC_WS)  # --stream: ชี้ไปที่ stand-in ได้ (price_feed.py serve)
+
+# 🚚 Fetch Settings
+FETCH_WORKERS = 8          # จำนวน request ที่ยิงพร้อมกันสูงสุด
+CANDLE_DIR = 'data/candles'
+RESIDENT_CANDLES = False   # --daemon เปิดเอง: เก็บแท่ง 1m ไว้ใน RAM ข้ามรอบ (อ่านไฟล์ครั้งเดียว, ต่อเฉพาะแท่งใหม่)
+INDICATOR_DIR = 'data/indicators'
+WARMUP_BARS = 600          # EMA200 / VWAP(288) ต้องใช้ประวัติย้อนหลังพอ (นับเป็นแท่ง TIMEFRAME)
+RETENTION_BARS = 2000      # เก็บแท่งเทียนย้อนหลังสูงสุด (~7 วันที่ TF 5m)
+
+# 🧱 Multi-Timeframe Settings
+BASE_TIMEFRAME = '1m'      # ดึง/เก็บแค่ TF นี้ แล้วประกอบ TF อื่นเอง (ตั้ง = TIMEFRAME เพื่อดึง TIMEFRAME ตรงๆ แบบเดิม)
+MTF_TIMEFRAMES = ['5m', '15m', '1h', '4h']
+HTF_FILTER = None          # เช่น '1h' = LONG เฉพาะเมื่อ close ของ 1h อยู่เหนือ EMA200 (SHORT กลับกัน)
+HTF_WARMUP_BARS = 300      # แท่ง HTF ที่ต้องมีก่อน EMA200 ใช้ได้
+
+# 🛑 Exchange Stop Orders
+STOP_MODE = os.environ.get('STOP_MODE', 'paper')   # 'paper' = SL อยู่แค่ใน ledger (เหมือนเดิม), 'live' = วาง conditional stop จริงบน OKX swap
+# ⚠️ live: bot ไม่เปิด position จริงเอง -> วาง stop เฉพาะเหรียญที่มี USDT swap และบัญชีถือ position ฝั่งเดียวกันอยู่ (ไม่งั้นข้าม, ดู stop_orders.py)
+STOP_TD_MODE = 'cross'
+OKX_API_KEY = os.environ.get('OKX_API_KEY')        # ใช้เฉพาะ STOP_MODE = 'live'
+OKX_API_SECRET = os.environ.get('OKX_API_SECRET')
+OKX_API_PASSPHRASE = os.environ.get('OKX_API_PASSPHRASE')
+
+# ⏱️ Metrics Settings
+METRICS_PATH = 'data/metrics.jsonl'   # 1 บรรทัด JSON ต่อรอบ (เวลาแต่ละขั้น, จำนวน API call, bytes)
+METRICS_PORT = 9108                   # daemon: Prometheus /metrics (None = ปิด)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')  # เฉพาะเครื่องนี้; ตั้ง 0.0.0.0 เองถ้าจะให้ Prometheus เครื่องอื่นดึง
+
+ENTRY_THRESHOLDS = dict(rsi_long=RSI_LONG, rsi_short=RSI_SHORT, adx_min=ADX_MIN, vol_mult=VOL_MULT)
+
+def base_bars(bars, timeframe):
+    # warmup / retention are set in `timeframe` bars; the store counts BASE_TIMEFRAME bars
+    return bars * timeframe_ms(timeframe) // timeframe_ms(BASE_TIMEFRAME)
+
+BASE_WARMUP_BARS = max(base_bars(WARMUP_BARS, TIMEFRAME), base_bars(HTF_WARMUP_BARS, HTF_FILTER) if HTF_FILTER else 0)
+BASE_RETENTION_BARS = max(base_bars(RETENTION_BARS, TIMEFRAME), BASE_WARMUP_BARS)
+BOOK_TIMEFRAMES = [tf for tf in dict.fromkeys([TIMEFRAME] + ([HTF_FILTER] if HTF_FILTER else []) + MTF_TIMEFRAMES)
+                   if timeframe_ms(tf) > timeframe_ms(BASE_TIMEFRAME)]
+
+exchange = ccxt.okx({'enableRateLimit': True})
+candle_store = CandleStore(CANDLE_DIR, warmup_bars=BASE_WARMUP_BARS, retention_bars=BASE_RETENTION_BARS)
+timeframe_books = {}       # symbol -> MultiTimeframe (bars ของทุก TF ที่ประกอบจาก BASE_TIMEFRAME)
+indicator_engine = IndicatorEngine(INDICATOR_DIR, TIMEFRAME)
+notifier = DiscordNotifier(DISCORD_WEBHOOK_URL, DISCORD_OUTBOX)
+screener = UniverseScreener(UNIVERSE_PATH, top_k=SCREENER_TOP_K, refresh_sec=SCREENER_REFRESH_SEC,
+                             min_quote_volume=MIN_QUOTE_VOLUME)
+metrics = Metrics()
+metrics.instrument_session(exchange.session, 'okx')
+metrics.instrument_session(notifier.session, 'discord')
+trading_client = None
+if STOP_MODE == 'live':
+    trading_client = ccxt.okx({'apiKey': OKX_API_KEY, 'secret': OKX_API_SECRET, 'password': OKX_API_PASSPHRASE,
+                               'enableRateLimit': True})
+    metrics.instrument_session(trading_client.session, 'okx_trade')
+stops = StopOrders(trading_client, STOP_MODE, LEVERAGE, STOP_TD_MODE)
 
 # ==========================================
 # 🔔 DISCORD NOTIFICATION
@@ -57,108 +148,147 @@ def send_discord_alert(action_type, symbol, side, price, size_usdt=0, pnl_usdt=0
     else:
         return
 
-    data = {
-        "username": "Infinity Bot ♾️",
-        "embeds": [{
-            "title": title,
-            "description": desc,
-            "color": color,
-            "fields": [{"name": "⏰ Time (UTC)", "value": datetime.now(timezone.utc).strftime('%H:%M:%S'), "inline": True}]
-        }]
-    }
-    try: requests.post(DISCORD_WEBHOOK_URL, json=data)
-    except: pass
+    # queued: the post happens on the notifier thread, never inside the trading cycle
+    notifier.send({
+        "title": title,
+        "description": desc,
+        "color": color,
+        "fields": [{"name": "⏰ Time (UTC)", "value": datetime.now(timezone.utc).strftime('%H:%M:%S'), "inline": True}]
+    })
 
 # ==========================================
 # 📚 GOOGLE SHEETS FUNCTIONS (ACCOUNTING)
 # ==========================================
+@metrics.timed('connect_sheet')
 def connect_google_sheet():
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     creds = ServiceAccountCredentials.from_json_keyfile_dict(json.loads(CREDS_JSON), scope)
     client = gspread.authorize(creds)
+    metrics.instrument_session(client.http_client.session, 'sheets')
     return client.open(SHEET_NAME)
 
-def get_balance(sheet):
-    try:
-        ws = sheet.worksheet('summary')
-        val = ws.acell('B1').value
-        # ถ้าอ่านค่าไม่ได้ หรือยังไม่มีค่า ให้เริ่มที่ 200.0
-        return float(val) if val else 200.0
-    except:
-        return 200.0
-
-def update_balance(sheet, new_balance):
-    try:
-        ws = sheet.worksheet('summary')
-        ws.update('B1', new_balance)
-        print(f"💰 Balance Updated: {new_balance:.2f} USDT")
-    except Exception as e:
-        print(f"❌ Error updating balance: {e}")
+# The local ledger is the source of truth; SheetMirror copies it to the sheet.
+def get_balance(ledger):
+    return ledger.balance()
 
-def get_active_trades(sheet):
-    try:
-        ws = sheet.worksheet('active_trades')
-        return pd.DataFrame(ws.get_all_records())
-    except: return pd.DataFrame()
+def get_active_trades(ledger):
+    # __slots__ records: the manager loop reads attributes instead of boxing rows with iterrows()
+    return ledger.positions()
 
-def log_new_trade(sheet, symbol, side, entry, sl, margin_size, current_balance):
-    ws = sheet.worksheet('active_trades')
+@metrics.timed(symbol_arg=1)
+def log_new_trade(ledger, symbol, side, entry, sl, margin_size, current_balance):
     # Row: Symbol, Side, Entry, Current_SL, Trailing_Step, Margin_Size, Timestamp
-    ws.append_row([symbol, side, entry, sl, 0, margin_size, str(datetime.now())])
+    opened = str(datetime.now())
+    ledger.open_trade(symbol, side, entry, sl, margin_size, opened)
     print(f"✅ Logged Open: {symbol} (Size: {margin_size:.2f} USDT)")
+    stops.place(ledger, symbol, side, entry, sl, margin_size, opened)
     
     send_discord_alert("OPEN", symbol, side, entry, size_usdt=margin_size, balance=current_balance)
 
-def close_trade(sheet, symbol, side, entry, exit_price, margin_size, reason):
+@metrics.timed(symbol_arg=1)
+def close_trade(ledger, symbol, side, entry, exit_price, margin_size, reason):
+    # live stop on the exchange: it owns the exit, the next reconcile books its real fill
+    if stops.protects(ledger, symbol):
+        print(f"⏳ {symbol}: {reason} at {exit_price}, waiting for the exchange stop to fill")
+        return
     # Calculate PnL
     # สูตร: (Exit - Entry) / Entry * Leverage * Margin
-    if side == 'LONG':
-        roe = ((exit_price - entry) / entry) * LEVERAGE
-    else:
-        roe = ((entry - exit_price) / entry) * LEVERAGE
+    roe = trade_roe(side, entry, exit_price, LEVERAGE)
+    pnl_usdt = trade_pnl(margin_size, roe)
     
-    pnl_usdt = margin_size * (roe / 100)
+    # Balance, History and Active are updated in one transaction
+    new_balance = ledger.close_trade(symbol, exit_price, pnl_usdt, roe, reason, str(datetime.now()))
+    if new_balance is None: return
+    print(f"💰 Balance Updated: {new_balance:.2f} USDT")
+    print(f"❌ Closed {symbol}: {pnl_usdt:+.2f} USDT")
     
-    # 1. Update Balance in Sheet
-    current_balance = get_balance(sheet)
-    new_balance = current_balance + pnl_usdt
-    update_balance(sheet, new_balance)
-
-    # 2. Add to History
-    ws_hist = sheet.worksheet('trade_history')
-    result = "WIN" if pnl_usdt > 0 else "LOSS"
-    # Row: Symbol, Side, Entry, Exit, PnL_USDT, ROE%, Result, Reason, Balance_After, Timestamp
-    ws_hist.append_row([symbol, side, entry, exit_price, pnl_usdt, roe, result, reason, new_balance, str(datetime.now())])
-    
-    # 3. Remove from Active
-    ws_active = sheet.worksheet('active_trades')
-    try:
-        cell = ws_active.find(symbol)
-        ws_active.delete_rows(cell.row)
-        print(f"❌ Closed {symbol}: {pnl_usdt:+.2f} USDT")
-        
-        send_discord_alert("CLOSE", symbol, side, exit_price, pnl_usdt=pnl_usdt, pnl_roe=roe, balance=new_balance, reason=reason)
-    except: pass
+    send_discord_alert("CLOSE", symbol, side, exit_price, pnl_usdt=pnl_usdt, pnl_roe=roe, balance=new_balance, reason=reason)
 
-def update_sl(sheet, symbol, new_sl, new_step):
-    ws = sheet.worksheet('active_trades')
-    try:
-        cell = ws.find(symbol)
-        ws.update_cell(cell.row, 4, new_sl) # Col 4 = Current_SL
-        ws.update_cell(cell.row, 5, new_step) # Col 5 = Step
+@metrics.timed(symbol_arg=1)
+def update_sl(ledger, symbol, new_sl, new_step):
+    if ledger.update_sl(symbol, new_sl, new_step):
         print(f"🔄 Updated SL {symbol} (Step {new_step})")
-    except: pass
+        stops.amend(symbol, new_sl, new_step)   # sent in one flush at the end of the manager pass
 
 # ==========================================
 # 📊 TECHNICAL ANALYSIS & MAIN LOGIC
 # ==========================================
-def fetch_data(symbol):
+_throttle_lock = threading.Lock()
+_last_request_at = [0.0]
+
+def _throttle(client):
+    # ccxt's own throttle is not thread-safe, so space out request starts here
+    # reserve the next start slot under the lock, sleep outside it so other workers can queue up
+    interval = getattr(client, 'rateLimit', 0) / 1000.0
+    with _throttle_lock:
+        start = max(time.monotonic(), _last_request_at[0] + interval)
+        _last_request_at[0] = start
+    wait = start - time.monotonic()
+    if wait > 0: time.sleep(wait)
+
+def timeframe_book(symbol):
+    if symbol not in timeframe_books:
+        timeframe_books[symbol] = MultiTimeframe(BASE_TIMEFRAME, BOOK_TIMEFRAMES, keep=RETENTION_BARS)
+    return timeframe_books[symbol]
+
+def resident_candles():
+    # only the stream scanner can read bars straight from the book; panel mode needs DataFrames
+    return RESIDENT_CANDLES and SCAN_MODE == 'stream' and TIMEFRAME in BOOK_TIMEFRAMES
+
+def last_price(data):
+    # fetch_data() hands out a DataFrame, or the MultiTimeframe book itself in resident mode
+    return data.last_close() if isinstance(data, MultiTimeframe) else data['close'].iloc[-1]
+
+@metrics.timed('fetch', symbol_arg=0)
+def fetch_data(symbol, client=None):
+    # Only candles newer than the local store are downloaded; the rest comes from disk.
+    # One request per symbol: TIMEFRAME and the HTF are rolled up from BASE_TIMEFRAME bars.
+    client = client or exchange
+    def fetch(since, limit):
+        _throttle(client)
+        return client.fetch_ohlcv(symbol, BASE_TIMEFRAME, since=since, limit=limit)
     try:
-        ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=100)
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        return df
+        now_ms = client.milliseconds()
+        if resident_candles():
+            # daemon: fold only the new bars into the resident book, no per-cycle DataFrames
+            new, forming, reset = candle_store.advance(fetch, symbol, BASE_TIMEFRAME, now_ms=now_ms)
+            book = timeframe_book(symbol)
+            book.advance(new, forming, candle_store.history(symbol, BASE_TIMEFRAME) if reset or book.last_ts is None else None)
+            return book
+        df = candle_store.sync(fetch, symbol, BASE_TIMEFRAME, now_ms=now_ms)
+        if not BOOK_TIMEFRAMES: return df
+        book = timeframe_book(symbol)
+        book.update(df, now_ms)
+        return book.frame(TIMEFRAME) if TIMEFRAME in book.builders else df
     except: return None
 
+def fetch_all(symbols, client=None, max_workers=FETCH_WORKERS):
+    """Fetch candles for every symbol concurrently. Returns {symbol: df or None}."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols: return {}
+    workers = max(1, min(max_workers, len(symbols)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda s: fetch_data(s, client), symbols)
+        return dict(zip(symbols, results))
+
+def get_universe(client=None):
+    # SYMBOLS is the fallback when the screener is off or the exchange call fails
+    if not SCREENER_TOP_K: return list(SYMBOLS)
+    with metrics.stage('screener'):
+        return screener.universe(client or exchange, fallback=SYMBOLS)
+
+def htf_trend(symbols, now_ms):
+    """(long_ok, short_ok) arrays from the last closed HTF_FILTER bar of each symbol."""
+    htf_ms = timeframe_ms(HTF_FILTER)
+    close, trend = [], []
+    for symbol in symbols:
+        f = timeframe_book(symbol).frame(HTF_FILTER)
+        f = f[f['timestamp'] + htf_ms <= now_ms]
+        close.append(f['close'].iloc[-1] if len(f) else float('nan'))
+        trend.append(ema(f['close'].to_numpy())[-1] if len(f) else float('nan'))
+    return htf_filter(np.array(close), np.array(trend))
+
+@metrics.timed()
 def calculate_indicators(df):
     df['ema200'] = ta.trend.ema_indicator(df['close'], window=200)
     df['adx'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
@@ -168,68 +298,92 @@ def calculate_indicators(df):
     df['rsi7'] = ta.momentum.rsi(df['close'], window=7)
     return df
 
-def main():
+def main(profile=False):
     print("🤖 Bot Running...")
+    metrics.reset()
     
     if not CREDS_JSON: 
         print("❌ Error: Secrets not found")
         return
 
-    try: sheet = connect_google_sheet()
-    except Exception as e:
-        print(f"❌ Connection Error: {e}")
-        return
-
-    # 1️⃣ ดึงยอดเงินล่าสุด (Real-time Balance from Sheet)
-    current_balance = get_balance(sheet)
+    ledger = Ledger(LEDGER_PATH)
+    try:
+        mirror = SheetMirror(ledger, connect_google_sheet)
+        try: mirror.reconcile(INITIAL_BALANCE)
+        except Exception as e:
+            print(f"❌ Connection Error: {e}")
+            return
+
+        if profile: profile_call(run_cycle, ledger)
+        else: run_cycle(ledger)
+
+        with metrics.stage('sheet_sync'):
+            try: mirror.sync_once()
+            except Exception as e: print(f"⚠️ Sheet mirror failed, will retry next run: {e}")
+    finally:
+        ledger.close()
+    # give queued alerts a moment to go out; leftovers stay in the outbox for the next run
+    with metrics.stage('discord_flush'):
+        if not notifier.flush(timeout=15): print(f"📮 {notifier.pending()} Discord alerts left in outbox")
+    print(metrics.summary(metrics.emit(METRICS_PATH)))
+
+def run_cycle(ledger):
+    # 1️⃣ ดึงยอดเงินล่าสุด (Balance from local ledger)
+    current_balance = get_balance(ledger)
     print(f"💰 Current Balance: {current_balance:.2f} USDT")
 
-    active_df = get_active_trades(sheet)
-    active_symbols = active_df['Symbol'].tolist() if not active_df.empty else []
+    positions = get_active_trades(ledger)
+
+    # 🛑 stops that already executed on the exchange: book them at the real fill price
+    with metrics.stage('stops'):
+        try: fills = dict(stops.reconcile(ledger))
+        except Exception as e:
+            print(f"⚠️ Stop reconcile failed, will retry next cycle: {e}")
+            fills = {}
+    for trade in positions:
+        if trade.symbol in fills:
+            ledger.drop_stop(trade.symbol)
+            close_trade(ledger, trade.symbol, trade.side, trade.entry, fills[trade.symbol], trade.margin_size, "Exchange Stop Fill")
+    positions = [p for p in positions if p.symbol not in fills]
+    active_symbols = [p.symbol for p in positions]
+
+    current_hour = datetime.now(timezone.utc).hour
+    session_open = in_session(current_hour, START_HOUR_UTC, END_HOUR_UTC)
+
+    # 📥 ดึงแท่งเทียนทุกเหรียญในรอบเดียว (Manager + Scanner ใช้ร่วมกัน)
+    universe = get_universe() if session_open else []
+    scan_symbols = [s for s in universe if s not in active_symbols]
+    with metrics.stage('fetch_all'):
+        frames = fetch_all(active_symbols + scan_symbols)
 
     # 2️⃣ MANAGER: ดูแลออเดอร์เก่า (Trailing / Exit)
-    if not active_df.empty:
-        for index, trade in active_df.iterrows():
-            symbol = trade['Symbol']
-            side = trade['Side']
-            entry = float(trade['Entry'])
-            current_sl = float(trade['Current_SL'])
-            step = int(trade['Trailing_Step'])
-            margin_size = float(trade['Margin_Size']) # ดึงขนาดไม้ที่ลงไป
-            
-            df = fetch_data(symbol)
-            if df is None: continue
-            current_price = df['close'].iloc[-1]
-            
-            # 2.1 Check SL Hit
-            hit_sl = False
-            if side == 'LONG' and current_price <= current_sl: hit_sl = True
-            elif side == 'SHORT' and current_price >= current_sl: hit_sl = True
-            
-            if hit_sl:
-                close_trade(sheet, symbol, side, entry, current_sl, margin_size, "SL/Trailing Hit")
-                continue
-
-            # 2.2 Check Trailing Update
-            if side == 'LONG':
-                max_roe = ((current_price - entry) / entry) * LEVERAGE
-                if max_roe >= (step + 1) * TRAILING_STEP_ROE:
-                    new_step = step + 1
-                    locked_roe = (new_step - 1) * TRAILING_STEP_ROE
-                    new_sl = entry * (1 + (locked_roe / LEVERAGE))
-                    update_sl(sheet, symbol, new_sl, new_step)
-            
-            elif side == 'SHORT':
-                max_roe = ((entry - current_price) / entry) * LEVERAGE
-                if max_roe >= (step + 1) * TRAILING_STEP_ROE:
-                    new_step = step + 1
-                    locked_roe = (new_step - 1) * TRAILING_STEP_ROE
-                    new_sl = entry * (1 - (locked_roe / LEVERAGE))
-                    update_sl(sheet, symbol, new_sl, new_step)
+    for trade in positions:
+        symbol = trade.symbol
+        side = trade.side
+        entry = trade.entry
+        current_sl = trade.current_sl
+        step = trade.trailing_step
+        margin_size = trade.margin_size # ดึงขนาดไม้ที่ลงไป
+        
+        df = frames.get(symbol)
+        if df is None: continue
+        current_price = last_price(df)
+        
+        # 2.1 Check SL Hit (book the price we actually saw, it may be past the SL)
+        if sl_hit(side, current_price, current_sl):
+            close_trade(ledger, symbol, side, entry, current_price, margin_size, "SL/Trailing Hit")
+            continue
+
+        # 2.2 Check Trailing Update
+        upgrade = trail_update(side, entry, step, current_price, TRAILING_STEP_ROE, LEVERAGE)
+        if upgrade:
+            new_step, new_sl = upgrade
+            update_sl(ledger, symbol, new_sl, new_step)
+    with metrics.stage('stops'):
+        stops.flush(ledger)
 
     # 3️⃣ SCANNER: หาออเดอร์ใหม่
-    current_hour = datetime.now(timezone.utc).hour
-    if not (START_HOUR_UTC <= current_hour <= END_HOUR_UTC):
+    if not session_open:
         print("💤 Outside Active Hours.")
         return
 
@@ -237,53 +391,162 @@ def main():
 
     print(f"🔎 Scanning markets at {datetime.now(timezone.utc).strftime('%H:%M:%S')} UTC...")
 
-    for symbol in SYMBOLS:
+    # คำนวณ indicator + เงื่อนไขเข้าเทรดของทุกเหรียญเป็นตารางเดียว
+    now_ms = exchange.milliseconds()
+    scan_frames = {s: frames.get(s) for s in scan_symbols}
+    if SCAN_MODE == 'panel':
+        with metrics.stage('indicators'):
+            signals = scan_panel(scan_frames, now_ms, TIMEFRAME, **ENTRY_THRESHOLDS)
+    else:
+        rows = {}
+        for symbol, df in scan_frames.items():
+            if df is None: continue
+            # อัปเดต indicator แบบ incremental เฉพาะแท่งที่ปิดใหม่ (แทนการคำนวณทั้ง DataFrame)
+            with metrics.stage('indicators', symbol):
+                if isinstance(df, MultiTimeframe):
+                    row = indicator_engine.feed(symbol, lambda after: df.builders[TIMEFRAME].closed_after(after, now_ms))
+                else:
+                    row = indicator_engine.update(symbol, df, now_ms)
+            if row is not None: rows[symbol] = row
+        signals = evaluate_signals(pd.DataFrame.from_dict(rows, orient='index'), **ENTRY_THRESHOLDS)
+
+    # 🧭 HTF trend filter: เข้าเฉพาะทิศเดียวกับเทรนด์ TF ใหญ่ (bars มาจาก 1m ชุดเดียวกัน ไม่ต้องดึงเพิ่ม)
+    if HTF_FILTER and len(signals):
+        long_ok, short_ok = htf_trend(signals.index, now_ms)
+        signals['long_entry'] = signals['long_entry'] & long_ok
+        signals['short_entry'] = signals['short_entry'] & short_ok
+
+    trade_margin_size = current_balance * PCT_BALANCE_PER_TRADE
+
+    for symbol in universe:
         if symbol in active_symbols: 
             print(f"⏩ {symbol}: Holding position. Skip.")
             continue 
 
-        df = fetch_data(symbol)
-        if df is None: 
+        if scan_frames.get(symbol) is None: 
             print(f"⚠️ {symbol}: Fetch Error")
             continue
-            
-        df = calculate_indicators(df)
-        row = df.iloc[-2] 
+        if symbol not in signals.index: continue
+        row = signals.loc[symbol]
 
         # --- ส่วน DEBUG ที่เพิ่มขึ้นมา ---
         # ปริ้นท์ค่า Indicator ออกมาดูเลย ว่าทำไมถึงไม่เข้า
-        rsi_val = row['rsi7']
-        adx_val = row['adx']
-        vol_check = row['volume'] > (row['vol_ma'] * 1.2)
-        trend_long = row['close'] > row['ema200'] and row['close'] > row['vwap']
-        trend_short = row['close'] < row['ema200'] and row['close'] < row['vwap']
+        trend_long = row['trend_long']
+        trend_short = row['trend_short']
         
         # ปริ้นท์สถานะ (บรรทัดนี้แหละที่จะบอกความจริง!)
-        print(f"📊 {symbol} | RSI: {rsi_val:.1f} | ADX: {adx_val:.1f} | Vol: {'✅' if vol_check else '❌'} | Trend: {'🐂' if trend_long else ('🐻' if trend_short else 'Eq')}")
+        print(f"📊 {symbol} | RSI: {row['rsi7']:.1f} | ADX: {row['adx']:.1f} | Vol: {'✅' if row['has_volume'] else '❌'} | Trend: {'🐂' if trend_long else ('🐻' if trend_short else 'Eq')}")
         # -------------------------------
 
-        has_volume = vol_check
-        strong_trend = adx_val > 25
-        
-        trade_margin_size = current_balance * PCT_BALANCE_PER_TRADE
-
         # ENTRY LOGIC (เหมือนเดิม)
-        if trend_long and strong_trend:
-            if rsi_val < 40 and has_volume:
-                sl = row['close'] * (1 - (INITIAL_SL_ROE / LEVERAGE))
-                log_new_trade(sheet, symbol, 'LONG', row['close'], sl, trade_margin_size, current_balance)
+        if trend_long and row['strong_trend']:
+            if row['long_entry']:
+                sl = initial_sl('LONG', row['close'], INITIAL_SL_ROE, LEVERAGE)
+                log_new_trade(ledger, symbol, 'LONG', row['close'], sl, trade_margin_size, current_balance)
             else:
                 # ถ้าเจอเทรนด์ แต่ RSI หรือ Volume ไม่ผ่าน ให้ปริ้นท์บอก
-                print(f"   Constructor -> 🐂 LONG Candidate but waiting for trigger (RSI<40 or Vol)")
+                print(f"   Constructor -> 🐂 LONG Candidate but waiting for trigger (RSI<{RSI_LONG} or Vol)")
 
-        elif trend_short and strong_trend:
-            if rsi_val > 60 and has_volume:
-                sl = row['close'] * (1 + (INITIAL_SL_ROE / LEVERAGE))
-                log_new_trade(sheet, symbol, 'SHORT', row['close'], sl, trade_margin_size, current_balance)
+        elif trend_short and row['strong_trend']:
+            if row['short_entry']:
+                sl = initial_sl('SHORT', row['close'], INITIAL_SL_ROE, LEVERAGE)
+                log_new_trade(ledger, symbol, 'SHORT', row['close'], sl, trade_margin_size, current_balance)
             else:
-                print(f"   Constructor -> 🐻 SHORT Candidate but waiting for trigger (RSI>60 or Vol)")
+                print(f"   Constructor -> 🐻 SHORT Candidate but waiting for trigger (RSI>{RSI_SHORT} or Vol)")
+
+# ==========================================
+# ♾️ DAEMON MODE (long-running, aligned to candle close)
+# ==========================================
+def seconds_until_next_close(now=None):
+    tf_sec = timeframe_ms(TIMEFRAME) / 1000
+    now = time.time() if now is None else now
+    return (now // tf_sec + 1) * tf_sec - now + CLOSE_DELAY_SEC
+
+def make_watcher(ledger, feed=None, on_change=None):
+    def close(symbol, side, entry, price, margin_size, reason):
+        close_trade(ledger, symbol, side, entry, price, margin_size, reason)
+        if on_change: on_change()
+    def update(symbol, new_sl, new_step):
+        update_sl(ledger, symbol, new_sl, new_step)
+        stops.flush(ledger)   # tick path: amend right away instead of waiting for the cycle
+        if on_change: on_change()
+    return PositionWatcher(ledger.active_trades, close, update, TRAILING_STEP_ROE, LEVERAGE, feed)
+
+async def _daemon(stream=False, profile=False):
+    global RESIDENT_CANDLES
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # warm the market cache once instead of on every cold start
+    await asyncio.to_thread(exchange.load_markets)
+    RESIDENT_CANDLES = True   # candles stay in memory between cycles; only new bars are fetched and folded in
+
+    ledger = Ledger(LEDGER_PATH)
+    mirror = SheetMirror(ledger, connect_google_sheet)
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(mirror.reconcile, INITIAL_BALANCE)
+            break
+        except Exception as e:
+            # only an empty/stale ledger needs the sheet; retry until it answers
+            print(f"❌ Connection Error: {e}")
+            try: await asyncio.wait_for(stop.wait(), timeout=30)
+            except asyncio.TimeoutError: pass
+    mirror.start()
+    notifier.start()  # resend anything left in the outbox
+    if METRICS_PORT: metrics.serve(METRICS_PORT, METRICS_HOST)
+
+    # ⚡ --stream: SL / trailing ถูกเช็คทุก tick จาก WebSocket ระหว่างรอบด้วย
+    watcher = feed_task = None
+    if stream:
+        feed = PriceFeed(lambda *tick: watcher.on_tick(*tick), PRICE_FEED_URL)
+        watcher = make_watcher(ledger, feed, mirror.nudge)
+        watcher.refresh()
+        feed_task = asyncio.ensure_future(feed.run(stop))
+
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=seconds_until_next_close())
+            break
+        except asyncio.TimeoutError: pass
+
+        metrics.reset()
+        try:
+            # a running cycle is never interrupted; shutdown waits for it to finish
+            if profile: await asyncio.to_thread(profile_call, run_cycle, ledger)
+            else: await asyncio.to_thread(run_cycle, ledger)
+        except Exception as e:
+            print(f"❌ Cycle Error: {e}")
+        mirror.nudge()
+        if watcher is not None:
+            # pick up trades opened this cycle (and drop closed ones) before the next tick
+            await asyncio.to_thread(watcher.refresh)
+            if watcher.latencies:
+                print(f"⚡ Tick actions: {len(watcher.latencies)}, worst tick-to-done {max(watcher.latencies):.2f} ms")
+                watcher.latencies.clear()
+        print(metrics.summary(metrics.emit(METRICS_PATH)))
+
+    if feed_task is not None: feed_task.cancel()
+    await asyncio.to_thread(mirror.stop)
+    await asyncio.to_thread(notifier.stop)
+    print("👋 Daemon stopped.")
+
+def run_daemon(stream=False, profile=False):
+    print("🤖 Bot Running (daemon)...")
+    if not CREDS_JSON:
+        print("❌ Error: Secrets not found")
+        return
+    asyncio.run(_daemon(stream, profile))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Infinity Bot")
+    parser.add_argument('--daemon', action='store_true', help="stay resident and run every candle close")
+    parser.add_argument('--stream', action='store_true', help="with --daemon: manage SL/trailing on every WebSocket tick")
+    parser.add_argument('--profile', action='store_true', help="dump cProfile + tracemalloc reports for each cycle to data/profile/")
+    args = parser.parse_args()
+    if args.daemon: run_daemon(args.stream, args.profile)
+    else: main(args.profile)
 
 
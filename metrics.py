@@ -0,0 +1,172 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime, timezone
+
+# ==========================================
+# ⏱️ CYCLE METRICS (stage timings, API calls, bytes)
+# ==========================================
+# Stages and counters accumulate until emit(), which writes one JSON line per
+# cycle and starts the next window. Everything is guarded by one lock because
+# fetches run on a thread pool and the sheet mirror / notifier on their own threads.
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {'cycles': 0, 'calls': defaultdict(int), 'bytes': defaultdict(int)}
+        self.last = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.stages = defaultdict(lambda: [0.0, 0])      # name -> [seconds, count]
+            self.symbols = defaultdict(dict)                 # symbol -> {stage: seconds}
+            self.calls = defaultdict(int)
+            self.bytes = defaultdict(int)
+
+    # ---------- timing ----------
+    def add(self, name, seconds, symbol=None):
+        with self._lock:
+            s = self.stages[name]
+            s[0] += seconds; s[1] += 1
+            if symbol is not None:
+                self.symbols[symbol][name] = self.symbols[symbol].get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name, symbol=None):
+        started = time.perf_counter()
+        try: yield
+        finally: self.add(name, time.perf_counter() - started, symbol)
+
+    def timed(self, name=None, symbol_arg=None):
+        """Decorator; symbol_arg = index of the positional arg that holds the symbol."""
+        def wrap(fn):
+            label = name or fn.__name__
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                symbol = args[symbol_arg] if symbol_arg is not None and len(args) > symbol_arg else None
+                with self.stage(label, symbol): return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    # ---------- API accounting ----------
+    def count(self, api, nbytes=0):
+        with self._lock:
+            self.calls[api] += 1
+            self.bytes[api] += nbytes
+            self.totals['calls'][api] += 1
+            self.totals['bytes'][api] += nbytes
+
+    def instrument_session(self, session, api):
+        """Count every response of a requests.Session (ccxt, gspread and the notifier all use one)."""
+        def hook(r, *args, **kwargs):
+            body = r.request.body if r.request is not None else None
+            self.count(api, len(r.content or b'') + (len(body) if body else 0))
+        session.hooks.setdefault('response', []).append(hook)
+        return session
+
+    # ---------- output ----------
+    def snapshot(self):
+        with self._lock:
+            return {
+                'ts': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'cycle_sec': round(time.perf_counter() - self.started, 4),
+                'stages': {k: {'sec': round(v[0], 4), 'n': v[1]} for k, v in self.stages.items()},
+                'symbols': {s: {k: round(v, 4) for k, v in d.items()} for s, d in self.symbols.items()},
+                'calls': dict(self.calls),
+                'bytes': dict(self.bytes),
+            }
+
+    def emit(self, path=None):
+        """Close the current window: append it to `path` (JSONL) and return it."""
+        record = self.snapshot()
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a') as f: f.write(json.dumps(record) + '\n')
+        with self._lock:
+            self.totals['cycles'] += 1
+            self.last = record
+        self.reset()
+        return record
+
+    def summary(self, record):
+        stages = ' | '.join(f"{k} {v['sec']:.2f}s" for k, v in sorted(record['stages'].items(), key=lambda kv: -kv[1]['sec']))
+        calls = ', '.join(f"{k} {v}" for k, v in record['calls'].items())
+        return f"⏱️ {record['cycle_sec']:.2f}s | {stages} | calls: {calls or '-'}"
+
+    def prometheus(self):
+        lines = ['# TYPE bot_cycles_total counter', f"bot_cycles_total {self.totals['cycles']}",
+                 '# TYPE bot_api_calls_total counter']
+        with self._lock:
+            lines += [f'bot_api_calls_total{{api="{k}"}} {v}' for k, v in self.totals['calls'].items()]
+            lines.append('# TYPE bot_api_bytes_total counter')
+            lines += [f'bot_api_bytes_total{{api="{k}"}} {v}' for k, v in self.totals['bytes'].items()]
+            last = self.last
+        if last:
+            lines += ['# TYPE bot_cycle_seconds gauge', f"bot_cycle_seconds {last['cycle_sec']}",
+                      '# TYPE bot_stage_seconds gauge']
+            lines += [f'bot_stage_seconds{{stage="{k}"}} {v["sec"]}' for k, v in last['stages'].items()]
+            lines.append('# TYPE bot_symbol_stage_seconds gauge')
+            lines += [f'bot_symbol_stage_seconds{{symbol="{s}",stage="{k}"}} {v}'
+                      for s, d in last['symbols'].items() for k, v in d.items()]
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """Prometheus text endpoint on a daemon thread (GET /metrics).
+
+        Loopback only by default; pass host='0.0.0.0' to let another machine scrape it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"📈 Metrics on http://{host}:{port}/metrics")
+        return server
+
+# ==========================================
+# 🔬 OPT-IN PROFILER (--profile)
+# ==========================================
+def profile_call(fn, *args, out_dir='data/profile', top=25, **kwargs):
+    """Run fn under cProfile + tracemalloc in the calling thread and dump both reports."""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    prof = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing: tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    prof.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        prof.disable()
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not tracing: tracemalloc.stop()
+        prof.dump_stats(os.path.join(out_dir, f"cycle-{stamp}.prof"))
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(top)
+        out.write(f"\n# tracemalloc: current {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n")
+        for stat in after.compare_to(before, 'lineno')[:top]: out.write(f"{stat}\n")
+        path = os.path.join(out_dir, f"cycle-{stamp}.txt")
+        with open(path, 'w') as f: f.write(out.getvalue())
+        print(f"🔬 Profile saved to {path} (+ .prof for snakeviz/pstats) | peak {peak / 1024:.0f} KiB")
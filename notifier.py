@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import threading
+import argparse
+import requests
+
+# ==========================================
+# 🔔 DISCORD NOTIFIER (queued, batched, persistent)
+# ==========================================
+# send() only appends to the queue; a background thread posts up to 10 embeds
+# per webhook call. Pending embeds live in an outbox file until Discord accepts
+# them, so a crash, a timeout or a 429 never loses an alert.
+MAX_EMBEDS = 10            # Discord limit per message
+USERNAME = "Infinity Bot ♾️"
+
+class DiscordNotifier:
+    def __init__(self, url, outbox_path='data/discord_outbox.jsonl', session=None,
+                 timeout=10, linger=0.5, max_backoff=60):
+        self.url = url
+        self.outbox_path = outbox_path
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.linger = linger           # wait this long for more alerts before posting
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.posts = 0
+        self._pending = self._load()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    # ---------- outbox ----------
+    def _load(self):
+        if not self.outbox_path or not os.path.exists(self.outbox_path): return []
+        pending = []
+        with open(self.outbox_path) as f:
+            for line in f:
+                try: pending.append(json.loads(line))
+                except ValueError: pass  # torn last line
+        if pending: print(f"📮 {len(pending)} undelivered Discord alerts from last run")
+        return pending
+
+    def _persist(self):
+        # rewrite after a delivery (called with the lock held); send() only appends
+        if not self.outbox_path: return
+        if not self._pending:
+            if os.path.exists(self.outbox_path): os.remove(self.outbox_path)
+            return
+        tmp = self.outbox_path + '.tmp'
+        with open(tmp, 'w') as f:
+            for embed in self._pending: f.write(json.dumps(embed) + '\n')
+        os.replace(tmp, self.outbox_path)
+
+    # ---------- producer side ----------
+    def send(self, embed):
+        with self._cond:
+            self._pending.append(embed)
+            if self.outbox_path:
+                os.makedirs(os.path.dirname(self.outbox_path) or '.', exist_ok=True)
+                with open(self.outbox_path, 'a') as f: f.write(json.dumps(embed) + '\n')
+            self._cond.notify()
+        self.start()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    # ---------- worker ----------
+    def _post(self, batch):
+        """Returns seconds to wait before retrying, or None when the batch is done."""
+        try:
+            r = self.session.post(self.url, json={"username": USERNAME, "embeds": batch}, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️ Discord unreachable: {e}")
+            return -1
+        self.posts += 1
+        if r.status_code == 429:
+            try: wait = float(r.json().get('retry_after', 1))
+            except ValueError: wait = float(r.headers.get('Retry-After', 1))
+            return max(wait, 0.1)
+        if r.status_code >= 500: return -1
+        if r.status_code >= 400:
+            # malformed embed: retrying would block the queue forever
+            print(f"⚠️ Discord rejected {len(batch)} alerts ({r.status_code}): {r.text[:200]}")
+        return None
+
+    def _sleep(self, seconds, until_full=False):
+        # called with the lock held; only stop (or a full batch) cuts the wait short
+        deadline = time.monotonic() + seconds
+        while not self._stop and not (until_full and len(self._pending) >= MAX_EMBEDS):
+            left = deadline - time.monotonic()
+            if left <= 0: return
+            self._cond.wait(left)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop: self._cond.wait()
+                if not self._pending: return
+                self._sleep(self.linger, until_full=True)  # let a burst coalesce into one post
+                batch = self._pending[:MAX_EMBEDS]
+            wait = self._post(batch)
+            if wait is None:
+                with self._cond:
+                    del self._pending[:len(batch)]
+                    self._persist()
+                    self.sent += len(batch)
+                    self._cond.notify_all()
+                backoff = 1
+                continue
+            if wait < 0:
+                wait, backoff = backoff, min(backoff * 2, self.max_backoff)
+            with self._cond:
+                self._sleep(wait)
+                if self._stop: return      # leave the rest in the outbox
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None or not self.url: return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='discord-notifier', daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=15):
+        """Wait until the queue is empty (or timeout). Returns True when everything was delivered."""
+        if self._pending and self._thread is None: self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending and self._thread is not None:
+                left = deadline - time.monotonic()
+                if left <= 0: break
+                self._cond.wait(left)
+            return not self._pending
+
+    def stop(self, timeout=15):
+        self.flush(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None: self._thread.join(self.timeout + 1)
+        self._thread = None
+
+# ==========================================
+# 🧪 LOCAL WEBHOOK STUB
+# ==========================================
+def serve_stub(port=8780, rate_limit_every=0, retry_after=1.0, delay=0.0):
+    """Tiny Discord stand-in: prints every accepted post, answers 429 every Nth request."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    counter = {'n': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            counter['n'] += 1
+            if delay: time.sleep(delay)
+            if rate_limit_every and counter['n'] % rate_limit_every == 0:
+                payload = json.dumps({'message': 'You are being rate limited.', 'retry_after': retry_after}).encode()
+                self.send_response(429)
+                self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            titles = [e.get('title') for e in body.get('embeds', [])]
+            print(f"📨 #{counter['n']} {len(titles)} embeds: {titles}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args): pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f"🧪 Discord stub on http://127.0.0.1:{port}/webhook")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discord webhook stub / notifier check")
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer 429 to every Nth post")
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds the stub takes per post")
+    parser.add_argument('--send', type=int, default=0, help="also push N test alerts through a notifier")
+    args = parser.parse_args()
+
+    server = serve_stub(args.port, args.rate_limit_every, args.retry_after, args.delay)
+    if not args.send:
+        server.serve_forever()
+    else:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        n = DiscordNotifier(f"http://127.0.0.1:{args.port}/webhook", outbox_path=None)
+        started = time.perf_counter()
+        for i in range(args.send): n.send({"title": f"test {i}", "description": "stub"})
+        enqueued = time.perf_counter()
+        n.stop(timeout=60)
+        print(f"✅ {n.sent}/{args.send} alerts in {n.posts} posts | enqueue {(enqueued - started) * 1000:.2f} ms total "
+              f"| delivered in {time.perf_counter() - started:.2f}s")
+        server.shutdown()
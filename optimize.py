@@ -0,0 +1,140 @@
+import os
+import time
+import json
+import random
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import backtest
+
+# ==========================================
+# 🔧 PARAMETER SWEEP (grid / random search over strategy settings)
+# ==========================================
+# Indicators do not depend on any swept setting, so they are computed once per
+# symbol and written to a single .npy panel. Workers open it with mmap_mode='r':
+# every process reads the same page-cache pages and nothing is pickled per task.
+DEFAULT_GRID = {
+    'initial_sl_roe': [0.05, 0.10, 0.15, 0.20],
+    'trailing_step_roe': [0.10, 0.15, 0.20, 0.30],
+    'leverage': [5, 10, 20],
+    'rsi_long': [30, 35, 40, 45],
+    'rsi_short': [55, 60, 65, 70],
+    'adx_min': [20, 25, 30],
+    'vol_mult': [1.0, 1.2, 1.5],
+    'start_hour_utc': [0, 7],
+    'end_hour_utc': [22, 24],
+}
+FIELDS = ['open', 'high', 'low', 'close', 'volume', 'ema200', 'adx', 'rsi7', 'vol_ma', 'vwap', 'decided_at', 'hour']
+HTF_FIELDS = ['htf_close', 'htf_ema200']   # only when prepare() was given an htf
+
+def write_panel(datasets, path):
+    """Pack {symbol: prepare() arrays} into one (fields x bars) float64 .npy; return (layout, fields)."""
+    fields = FIELDS + [f for f in HTF_FIELDS if all(f in d for d in datasets.values())]
+    layout, start = {}, 0
+    for symbol, d in datasets.items():
+        layout[symbol] = (start, start + len(d['close']))
+        start += len(d['close'])
+    panel = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(len(fields), start))
+    for symbol, d in datasets.items():
+        lo, hi = layout[symbol]
+        for row, field in enumerate(fields):
+            panel[row, lo:hi] = d[field]
+    panel.flush()
+    return layout, fields
+
+_datasets = None
+
+def _attach(path, layout, fields):
+    # runs once per worker: views into the shared read-only mapping, no copies
+    global _datasets
+    panel = np.load(path, mmap_mode='r')
+    _datasets = {symbol: {f: panel[row, lo:hi] for row, f in enumerate(fields)}
+                 for symbol, (lo, hi) in layout.items()}
+
+def _evaluate(configs):
+    results = []
+    for params in configs:
+        _, stats = backtest.run_backtest(_datasets, params)
+        results.append({**params, **stats})
+    return results
+
+def build_configs(grid, base, samples=0, seed=0):
+    """Full grid when samples == 0, otherwise `samples` distinct random picks from it."""
+    keys = list(grid)
+    total = int(np.prod([len(grid[k]) for k in keys]))
+    if samples and samples < total:
+        rng = random.Random(seed)
+        picks = set()
+        while len(picks) < samples:
+            picks.add(tuple(rng.randrange(len(grid[k])) for k in keys))
+        combos = [tuple(grid[k][i] for k, i in zip(keys, p)) for p in sorted(picks)]
+    else:
+        combos = itertools.product(*(grid[k] for k in keys))
+    configs = [{**base, **dict(zip(keys, c))} for c in combos]
+    return [c for c in configs if c['start_hour_utc'] <= c['end_hour_utc']]
+
+def sweep(datasets, configs, workers=None, panel_path='data/sweep/panel.npy', batch=None):
+    os.makedirs(os.path.dirname(panel_path) or '.', exist_ok=True)
+    layout, fields = write_panel(datasets, panel_path)
+    workers = workers or os.cpu_count() or 1
+    # a few batches per worker keeps every core busy without per-config IPC
+    batch = batch or max(1, len(configs) // (workers * 8))
+    batches = [configs[i:i + batch] for i in range(0, len(configs), batch)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(panel_path, layout, fields)) as pool:
+        for done, results in enumerate(pool.map(_evaluate, batches), start=1):
+            rows.extend(results)
+            if done % max(1, len(batches) // 10) == 0:
+                print(f"   {len(rows)}/{len(configs)} configs")
+    return pd.DataFrame(rows)
+
+def rank(results, by='roe_pct', min_trades=10):
+    ranked = results[results['trades'] >= min_trades]
+    return ranked.sort_values([by, 'max_drawdown_pct'], ascending=[False, True]).reset_index(drop=True)
+
+def _parse_param(text):
+    key, values = text.split('=', 1)
+    return key, [json.loads(v) for v in values.split(',')]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep strategy settings over stored candles")
+    parser.add_argument('--symbols', nargs='*', help="default: SYMBOLS from main.py")
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--htf', help="higher-timeframe trend filter, e.g. 1h (default: HTF_FILTER from main.py)")
+    parser.add_argument('--data-dir', default='data/history')
+    parser.add_argument('--synthetic-days', type=int, default=0, help="use random-walk candles instead of stored ones")
+    parser.add_argument('--param', action='append', default=[], type=_parse_param,
+                        help="override a grid axis, e.g. --param leverage=5,10")
+    parser.add_argument('--samples', type=int, default=500, help="random configs to try (0 = full grid)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--rank-by', default='roe_pct')
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--out', default='data/sweep/results.csv')
+    args = parser.parse_args()
+
+    import main
+    symbols = args.symbols or main.SYMBOLS
+    if args.synthetic_days:
+        bars = args.synthetic_days * 86_400_000 // backtest.timeframe_ms(args.timeframe)
+        frames = {s: backtest.synthetic_candles(bars, args.timeframe, seed=i) for i, s in enumerate(symbols)}
+    else:
+        frames = backtest.load_history(symbols, args.timeframe, args.data_dir)
+    if not frames:
+        print(f"❌ No candles under {args.data_dir} (run backtest.py --fetch-days N first)")
+        raise SystemExit(1)
+
+    started = time.perf_counter()
+    datasets = {s: backtest.prepare(df, args.timeframe, args.htf or main.HTF_FILTER) for s, df in frames.items()}
+    configs = build_configs({**DEFAULT_GRID, **dict(args.param)}, backtest.live_params(), args.samples, args.seed)
+    print(f"🔧 {len(configs)} configs x {len(datasets)} symbols on {args.workers or os.cpu_count()} workers")
+    results = rank(sweep(datasets, configs, args.workers), args.rank_by, args.min_trades)
+    elapsed = time.perf_counter() - started
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"✅ {len(configs)} configs in {elapsed:.1f}s ({len(configs) / elapsed:.1f} configs/sec) -> {args.out}")
+    cols = list(DEFAULT_GRID) + ['trades', 'win_rate', 'roe_pct', 'max_drawdown_pct']
+    print(results[[c for c in cols if c in results]].head(10).to_string())
@@ -0,0 +1,101 @@
+import time
+import threading
+import argparse
+
+# ==========================================
+# 💹 SHARED PRICE CACHE (one bulk ticker call for every viewer)
+# ==========================================
+# One instance per process (st.cache_resource in the dashboard). Page renders
+# only call watch() and read prices; a single background thread refreshes all
+# watched symbols with one fetch_tickers call every `interval` seconds, so the
+# exchange load is the same for 1 viewer or 100. When nobody has rendered for
+# `idle_after` seconds the thread stops polling until the next watch().
+
+class PriceCache:
+    def __init__(self, client, interval=5, idle_after=120):
+        self.client = client
+        self.interval = interval
+        self.idle_after = idle_after
+        self.prices = {}               # symbol -> (last, exchange_ts_ms)
+        self.updated_at = 0.0
+        self.api_calls = 0
+        self.error = None
+        self._symbols = set()
+        self._seen = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def watch(self, symbols):
+        """Register the symbols a render needs; starts the poller on first use."""
+        with self._lock:
+            self._seen = time.time()
+            new = set(symbols) - self._symbols
+            self._symbols |= new
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="price-cache", daemon=True)
+                self._thread.start()
+        if new: self._wake.set()       # a symbol we have no price for: poll now instead of waiting
+
+    def get(self, symbol):
+        return self.prices.get(symbol, (None, None))[0]
+
+    def age(self):
+        return time.time() - self.updated_at if self.updated_at else None
+
+    def poll(self):
+        with self._lock:
+            symbols = sorted(self._symbols)
+        if not symbols: return
+        tickers = self.client.fetch_tickers(symbols)
+        self.api_calls += 1
+        prices = dict(self.prices)
+        for symbol, t in tickers.items():
+            if t.get('last') is not None: prices[symbol] = (float(t['last']), t.get('timestamp'))
+        self.prices = prices           # swap, readers never see a half-updated dict
+        self.updated_at = time.time()
+
+    def _run(self):
+        while True:
+            if time.time() - self._seen > self.idle_after:
+                # nobody is looking: forget closed positions and sleep until the next watch()
+                with self._lock: self._symbols.clear()
+                self._wake.wait()
+            self._wake.clear()
+            try:
+                self.poll()
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                print(f"⚠️ Price cache poll failed: {e}")
+            self._wake.wait(self.interval)
+
+if __name__ == "__main__":
+    # load check: many simulated viewers share one poller
+    parser = argparse.ArgumentParser(description="Shared ticker cache load check")
+    parser.add_argument('--viewers', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--interval', type=float, default=1)
+    parser.add_argument('--live', action='store_true', help="poll OKX instead of a fake exchange")
+    args = parser.parse_args()
+
+    symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    if args.live:
+        import ccxt
+        client = ccxt.okx({'enableRateLimit': True})
+    else:
+        class FakeExchange:
+            def fetch_tickers(self, symbols=None):
+                return {s: {'last': 100.0 + i, 'timestamp': int(time.time() * 1000)} for i, s in enumerate(symbols)}
+        client = FakeExchange()
+
+    cache = PriceCache(client, interval=args.interval)
+    renders, deadline = 0, time.time() + args.seconds
+    while time.time() < deadline:
+        for _ in range(args.viewers):
+            cache.watch(symbols)
+            [cache.get(s) for s in symbols]
+            renders += 1
+        time.sleep(0.1)
+    print(f"👀 {renders:,} renders from {args.viewers} viewers -> {cache.api_calls} fetch_tickers calls "
+          f"in {args.seconds:.0f}s | {', '.join(f'{s} {cache.get(s)}' for s in symbols)}")
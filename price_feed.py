@@ -0,0 +1,270 @@
+import json
+import time
+import asyncio
+import argparse
+import aiohttp
+from strategy import sl_hit, trail_update
+
+# ==========================================
+# ⚡ REAL-TIME PRICE FEED (OKX public WebSocket)
+# ==========================================
+# Streams `tickers` for the symbols that have an open position so SL hits and
+# trailing steps are checked on every tick instead of once per candle.
+OKX_PUBLIC_WS = 'wss://ws.okx.com:8443/ws/v5/public'
+PING_SEC = 20              # OKX drops connections that are silent for 30s
+RECONNECT_MAX_SEC = 30
+
+def inst_id(symbol):
+    return symbol.replace('/', '-')
+
+def symbol_of(inst):
+    return inst.replace('-', '/')
+
+def parse_ticks(message):
+    """OKX push -> [(symbol, price, exchange_ts_ms)]. tickers use `last`, trades use `px`."""
+    ticks = []
+    for d in message.get('data') or []:
+        price = d.get('last') or d.get('px')
+        if not price or 'instId' not in d: continue
+        ticks.append((symbol_of(d['instId']), float(price), int(d.get('ts') or 0)))
+    return ticks
+
+class PriceFeed:
+    """Keeps one WebSocket subscribed to `symbols` and calls on_tick(symbol, price, ts, received).
+
+    watch() may be called at any time, also from worker threads; only the
+    difference is (un)subscribed. Reconnects with backoff and resubscribes everything.
+    """
+
+    def __init__(self, on_tick, url=OKX_PUBLIC_WS, channel='tickers'):
+        self.on_tick = on_tick
+        self.url = url
+        self.channel = channel
+        self.symbols = set()
+        self.ticks = 0
+        self._subscribed = set()
+        self._changed = asyncio.Event()
+        self._loop = None
+
+    def watch(self, symbols):
+        self.symbols = set(symbols)
+        if self._loop is None: self._changed.set()
+        else: self._loop.call_soon_threadsafe(self._changed.set)
+
+    def _args(self, symbols):
+        return [{'channel': self.channel, 'instId': inst_id(s)} for s in sorted(symbols)]
+
+    async def _sync(self, ws):
+        add, drop = self.symbols - self._subscribed, self._subscribed - self.symbols
+        if drop: await ws.send_json({'op': 'unsubscribe', 'args': self._args(drop)})
+        if add: await ws.send_json({'op': 'subscribe', 'args': self._args(add)})
+        self._subscribed = set(self.symbols)
+
+    async def _syncer(self, ws):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            await self._sync(ws)
+
+    async def _read(self, ws):
+        while True:
+            try:
+                msg = await ws.receive(timeout=PING_SEC)
+            except asyncio.TimeoutError:
+                await ws.send_str('ping')
+                continue
+            if msg.type != aiohttp.WSMsgType.TEXT: return
+            if msg.data == 'pong': continue
+            received = time.perf_counter()
+            message = json.loads(msg.data)
+            if message.get('event') == 'error':
+                print(f"⚠️ Price feed error: {message.get('msg')}")
+                continue
+            for symbol, price, ts in parse_ticks(message):
+                self.ticks += 1
+                self.on_tick(symbol, price, ts, received)
+
+    async def run(self, stop=None):
+        self._loop = asyncio.get_running_loop()
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while stop is None or not stop.is_set():
+                try:
+                    async with session.ws_connect(self.url) as ws:
+                        print(f"📡 Price feed connected ({self.url})")
+                        delay = 1
+                        self._subscribed = set()
+                        self._changed.set()
+                        syncer = asyncio.ensure_future(self._syncer(ws))
+                        try: await self._read(ws)
+                        finally: syncer.cancel()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Price feed disconnected: {e}")
+                if stop is not None and stop.is_set(): break
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SEC)
+
+# ==========================================
+# 🛡️ TICK-LEVEL POSITION MANAGER
+# ==========================================
+class PositionWatcher:
+    """Applies the manager rules (SL hit, trailing step) to every tick.
+
+    Positions are cached in memory and reloaded with refresh() after each cycle.
+    close(symbol, side, entry, price, margin, reason) and update(symbol, sl, step)
+    are blocking ledger calls, so they run in a worker thread; the cached
+    position is changed first so later ticks never act on it twice.
+    """
+
+    def __init__(self, load, close, update, step_roe, leverage, feed=None):
+        self.load = load
+        self.close = close
+        self.update = update
+        self.step_roe = step_roe
+        self.leverage = leverage
+        self.feed = feed
+        self.positions = {}
+        self.latencies = []   # ms from tick receipt until the close/update call has returned
+        self._tasks = set()   # in-flight handler tasks (the loop only keeps weak references)
+
+    def refresh(self):
+        self.positions = {t['Symbol']: {'side': t['Side'], 'entry': float(t['Entry']), 'sl': float(t['Current_SL']),
+                                        'step': int(t['Trailing_Step']), 'margin': float(t['Margin_Size'])}
+                          for t in self.load()}
+        if self.feed is not None: self.feed.watch(self.positions)
+
+    def on_tick(self, symbol, price, ts=0, received=None):
+        p = self.positions.get(symbol)
+        if p is None: return None
+        received = time.perf_counter() if received is None else received
+        if sl_hit(p['side'], price, p['sl']):
+            del self.positions[symbol]
+            self._dispatch(received, self.close, symbol, p['side'], p['entry'], price, p['margin'], "SL/Trailing Hit (tick)")
+            if self.feed is not None: self.feed.watch(self.positions)
+            return 'close'
+        upgrade = trail_update(p['side'], p['entry'], p['step'], price, self.step_roe, self.leverage)
+        if upgrade:
+            p['step'], p['sl'] = upgrade
+            self._dispatch(received, self.update, symbol, p['sl'], p['step'])
+            return 'trail'
+        return None
+
+    def _dispatch(self, received, fn, *args):
+        def run():
+            try: return fn(*args)
+            finally: self.latencies.append((time.perf_counter() - received) * 1000)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            run()  # no loop (tests / replay): run inline
+            return
+        task = asyncio.ensure_future(asyncio.to_thread(run))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Tick action failed: {task.exception()!r}")
+
+# ==========================================
+# 🧪 RECORD / REPLAY (local stand-in for the OKX endpoint)
+# ==========================================
+async def record(path, symbols, seconds, url=OKX_PUBLIC_WS):
+    """Append raw ticker pushes (one data entry per line) to a JSONL file."""
+    count = 0
+    with open(path, 'a') as f:
+        def on_tick(symbol, price, ts, received):
+            nonlocal count
+            f.write(json.dumps({'instId': inst_id(symbol), 'last': str(price), 'ts': str(ts)}) + '\n')
+            count += 1
+        feed = PriceFeed(on_tick, url)
+        feed.watch(symbols)
+        try: await asyncio.wait_for(feed.run(), timeout=seconds)
+        except asyncio.TimeoutError: pass
+    print(f"💾 Recorded {count} ticks to {path}")
+
+def load_ticks(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+async def serve_replay(path, host='127.0.0.1', port=8765, speed=1.0, loop_forever=False):
+    """Speak enough of the OKX protocol to replay recorded ticks to subscribers.
+
+    speed=0 sends every tick back to back; otherwise the recorded spacing is divided by speed.
+    """
+    from aiohttp import web
+    ticks = load_ticks(path)
+
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        wanted = set()
+
+        async def pump():
+            while True:
+                prev = None
+                for t in ticks:
+                    if speed and prev is not None:
+                        await asyncio.sleep(max(0, int(t['ts']) - prev) / 1000 / speed)
+                    prev = int(t['ts'])
+                    if t['instId'] in wanted:
+                        await ws.send_json({'arg': {'channel': 'tickers', 'instId': t['instId']}, 'data': [t]})
+                    elif not speed:
+                        await asyncio.sleep(0)
+                if not loop_forever: return
+        pumper = None
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT: break
+            if msg.data == 'ping':
+                await ws.send_str('pong')
+                continue
+            req = json.loads(msg.data)
+            ids = {a['instId'] for a in req.get('args', [])}
+            if req.get('op') == 'subscribe': wanted |= ids
+            elif req.get('op') == 'unsubscribe': wanted -= ids
+            for a in req.get('args', []):
+                await ws.send_json({'event': req.get('op'), 'arg': a})
+            if pumper is None: pumper = asyncio.ensure_future(pump())
+        if pumper is not None: pumper.cancel()
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/ws/v5/public', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"🧪 Replaying {len(ticks)} ticks on ws://{host}:{port}/ws/v5/public")
+    return runner
+
+async def _tail(url, symbols, seconds):
+    started = time.perf_counter()
+    feed = PriceFeed(lambda s, p, ts, r: print(f"{s} {p} ts={ts}"), url)
+    feed.watch(symbols)
+    try: await asyncio.wait_for(feed.run(), timeout=seconds)
+    except asyncio.TimeoutError: pass
+    print(f"📈 {feed.ticks} ticks in {time.perf_counter() - started:.1f}s")
+
+async def _serve_forever(path, port, speed):
+    await serve_replay(path, port=port, speed=speed, loop_forever=True)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OKX ticker feed tools")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('record', help="record live ticks to JSONL")
+    p.add_argument('path'); p.add_argument('--symbols', nargs='+', required=True)
+    p.add_argument('--seconds', type=float, default=60); p.add_argument('--url', default=OKX_PUBLIC_WS)
+    p = sub.add_parser('serve', help="replay a JSONL recording as a local OKX stand-in")
+    p.add_argument('path'); p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--speed', type=float, default=1.0)
+    p = sub.add_parser('tail', help="print ticks from a feed")
+    p.add_argument('--symbols', nargs='+', required=True)
+    p.add_argument('--seconds', type=float, default=30); p.add_argument('--url', default=OKX_PUBLIC_WS)
+    args = parser.parse_args()
+
+    if args.cmd == 'record': asyncio.run(record(args.path, args.symbols, args.seconds, args.url))
+    elif args.cmd == 'serve': asyncio.run(_serve_forever(args.path, args.port, args.speed))
+    else: asyncio.run(_tail(args.url, args.symbols, args.seconds))
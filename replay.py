@@ -0,0 +1,450 @@
+import os
+import io
+import re
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime, timezone
+import numpy as np
+import main
+import backtest
+from candle_store import CandleStore, COLUMNS, timeframe_ms
+from indicators import IndicatorEngine, IndicatorState
+from ledger import Ledger, HISTORY_COLUMNS
+from sheet_journal import ACTIVE_HEADER
+from notifier import DiscordNotifier
+from screener import UniverseScreener
+from stop_orders import StopOrders
+from resample import resample, MultiTimeframe
+
+# ==========================================
+# 🎞️ DETERMINISTIC REPLAY & CYCLE BENCHMARK
+# ==========================================
+# Runs the real main() bar by bar against in-memory exchange / sheet / webhook
+# backends fed from recorded 1m candles (CandleStore files, see `record`) or
+# synthetic ones. The clock is the fixture's: every cycle starts CLOSE_DELAY_SEC
+# after a TIMEFRAME close, the forming base bar is served flat at its open
+# (no look-ahead) and main.datetime follows the same clock, so two runs on the
+# same fixtures produce byte-identical decision logs.
+#
+#   python replay.py record --symbols BTC/USDT ETH/USDT --days 7 --fixtures data/fixtures
+#   python replay.py run --fixtures data/fixtures --symbols BTC/USDT ETH/USDT --out data/replay/base.jsonl
+#   python replay.py run --fixtures data/fixtures --symbols BTC/USDT ETH/USDT --check data/replay/base.jsonl
+#   python replay.py run --synthetic 10 --resident --check data/replay/base.jsonl   (daemon candle path)
+#   python replay.py bench --sizes 5,50,500
+#   python replay.py memory --symbols 200
+#   python replay.py fetch --symbols 30 --latency 0.2
+
+# ---------- fake backends ----------
+class FakeExchange:
+    """ccxt-shaped view of fixture candles up to `now` (fetch_ohlcv, fetch_tickers, milliseconds)."""
+    rateLimit = 0
+
+    def __init__(self, frames, base_timeframe='1m', metrics=None, latency=0.0):
+        self.base = base_timeframe
+        self.latency = latency         # seconds of simulated round trip per request
+        self.base_ms = timeframe_ms(base_timeframe)
+        self.data = {s: df[COLUMNS].to_numpy(dtype=float) for s, df in frames.items()}
+        self.ts = {s: d[:, 0].astype(np.int64) for s, d in self.data.items()}
+        self.metrics = metrics
+        self.now = 0
+
+    def _count(self):
+        if self.metrics: self.metrics.count('okx')
+        if self.latency: time.sleep(self.latency)
+
+    def milliseconds(self):
+        return self.now
+
+    def load_markets(self):
+        return {}
+
+    def _visible(self, symbol):
+        d = self.data[symbol][:np.searchsorted(self.ts[symbol], self.now, side='right')]
+        if len(d) and d[-1, 0] + self.base_ms > self.now:
+            # the forming bar has only traded at its open so far
+            d = d.copy()
+            d[-1, 2:5] = d[-1, 1]
+            d[-1, 5] = 0.0
+        return d
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=100):
+        self._count()
+        d = self._visible(symbol)
+        if timeframe != self.base:
+            d = resample(_frame(d), timeframe).to_numpy(dtype=float)
+        if since is not None: d = d[np.searchsorted(d[:, 0], since):][:limit]
+        else: d = d[-limit:]
+        return [[int(r[0]), *r[1:]] for r in d]
+
+    def fetch_tickers(self, symbols=None):
+        self._count()
+        out = {}
+        for symbol in (symbols or self.data):
+            d = self._visible(symbol)[-1440:]          # last 24h of 1m bars
+            if not len(d): continue
+            out[symbol] = {'symbol': symbol, 'last': d[-1, 4], 'high': d[:, 2].max(), 'low': d[:, 3].min(),
+                           'quoteVolume': float((d[:, 4] * d[:, 5]).sum()), 'timestamp': self.now}
+        return out
+
+def _frame(d):
+    import pandas as pd
+    df = pd.DataFrame(d, columns=COLUMNS)
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    return df
+
+def _a1(ref):
+    """'B2' -> (row, col), 0-based."""
+    letters, digits = re.match(r'([A-Z]+)(\d+)', ref).groups()
+    col = 0
+    for ch in letters: col = col * 26 + ord(ch) - 64
+    return int(digits) - 1, col - 1
+
+class FakeWorksheet:
+    def __init__(self, sheet, rows):
+        self.sheet = sheet
+        self.rows = [list(r) for r in rows]
+
+    def _cell(self, r, c):
+        return self.rows[r][c] if r < len(self.rows) and c < len(self.rows[r]) else ''
+
+    def acell(self, ref):
+        self.sheet._count()
+        class Cell: pass
+        cell = Cell()
+        cell.value = self._cell(*_a1(ref))
+        return cell
+
+    def get(self, rng):
+        self.sheet._count()
+        start, _, end = rng.partition(':')
+        (r0, c0), (r1, c1) = _a1(start), _a1(end or start)
+        return [[self._cell(r, c) for c in range(c0, c1 + 1)] for r in range(r0, r1 + 1)]
+
+    def get_all_values(self):
+        self.sheet._count()
+        return [list(r) for r in self.rows if any(v != '' for v in r)]
+
+    def get_all_records(self):
+        self.sheet._count()
+        rows = [r for r in self.rows if any(v != '' for v in r)]
+        return [dict(zip(rows[0], r)) for r in rows[1:]] if rows else []
+
+    def batch_update(self, data, **kwargs):
+        self.sheet._count()
+        for d in data:
+            r0, c0 = _a1(d['range'].split(':')[0])
+            for i, row in enumerate(d['values']):
+                while len(self.rows) <= r0 + i: self.rows.append([])
+                target = self.rows[r0 + i]
+                target.extend([''] * (c0 + len(row) - len(target)))
+                target[c0:c0 + len(row)] = list(row)
+
+    def append_rows(self, rows, **kwargs):
+        self.sheet._count()
+        self.rows.extend(list(r) for r in rows)
+
+class FakeSheet:
+    """The three worksheets main.py / SheetJournal use, starting empty like a new spreadsheet."""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.ws = {'summary': FakeWorksheet(self, [['Balance', '']]),
+                   'active_trades': FakeWorksheet(self, [ACTIVE_HEADER]),
+                   'trade_history': FakeWorksheet(self, [HISTORY_COLUMNS])}
+
+    def _count(self):
+        if self.metrics: self.metrics.count('sheets')
+
+    def worksheet(self, name):
+        return self.ws[name]
+
+class FakeWebhook:
+    """requests.Session stand-in for DiscordNotifier: accepts every post and keeps the embeds."""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.embeds = []
+
+    def post(self, url, json=None, timeout=None):
+        if self.metrics: self.metrics.count('discord')
+        self.embeds.extend(json['embeds'])
+        class Response: status_code = 204
+        return Response()
+
+class ReplayScreener(UniverseScreener):
+    # staleness follows the fixture clock instead of the wall clock
+    def universe(self, client, fallback=(), now=None):
+        return super().universe(client, fallback, client.milliseconds() / 1000)
+
+# ---------- harness ----------
+def synthetic(symbols, bars, seed=0):
+    frames = {}
+    for i in range(symbols):
+        df = backtest.synthetic_candles(bars, '1m', seed=seed + i)
+        df['timestamp'] -= df['timestamp'].iloc[0] % 86_400_000    # start on a UTC day, like real bars
+        frames[f"SYN{i}/USDT"] = df
+    return frames
+
+def install(frames, workdir, top_k=0, resident=False):
+    """Point main.py's module state at fake backends living in `workdir`. Returns (exchange, sheet, webhook)."""
+    m = main.metrics
+    exchange, sheet, webhook = FakeExchange(frames, main.BASE_TIMEFRAME, m), FakeSheet(m), FakeWebhook(m)
+    main.exchange = exchange
+    main.connect_google_sheet = lambda: sheet
+    main.notifier = DiscordNotifier('https://discord.invalid/replay', outbox_path=None, session=webhook, linger=0)
+    main.CREDS_JSON = 'replay'
+    # never let STOP_MODE=live in the environment send real orders from a replay
+    main.STOP_MODE = 'paper'
+    main.stops = StopOrders(None, 'paper', main.LEVERAGE, main.STOP_TD_MODE)
+    main.SYMBOLS = list(frames)
+    main.SCREENER_TOP_K = top_k
+    main.screener = ReplayScreener(os.path.join(workdir, 'universe.json'), top_k=top_k,
+                                   refresh_sec=main.SCREENER_REFRESH_SEC, min_quote_volume=0)
+    main.LEDGER_PATH = os.path.join(workdir, 'ledger.db')
+    main.METRICS_PATH = os.path.join(workdir, 'metrics.jsonl')
+    main.candle_store = CandleStore(os.path.join(workdir, 'candles'), warmup_bars=main.BASE_WARMUP_BARS,
+                                    retention_bars=main.BASE_RETENTION_BARS)
+    main.indicator_engine = IndicatorEngine(os.path.join(workdir, 'indicators'), main.TIMEFRAME)
+    main.timeframe_books.clear()
+    main.RESIDENT_CANDLES = resident      # daemon path: candles stay in memory between cycles
+
+    class ReplayDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            t = datetime.fromtimestamp(exchange.now / 1000, tz or timezone.utc)
+            return t if tz else t.replace(tzinfo=None)
+    main.datetime = ReplayDatetime
+    return exchange, sheet, webhook
+
+def _round(v):
+    return float(f"{v:.10g}") if isinstance(v, float) else v
+
+def decisions(ledger, after_id):
+    """(open positions, trades closed since after_id, last history id) from the ledger."""
+    active = [[_round(t[k]) for k in ACTIVE_HEADER] for t in ledger.active_trades()]
+    with ledger._lock:
+        rows = ledger.conn.execute("SELECT id, symbol, side, entry, exit, pnl_usdt, roe, result, reason, balance_after, "
+                                   "timestamp FROM trade_history WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+    closed = [[_round(v) for v in r[1:]] for r in rows]
+    return active, closed, (rows[-1][0] if rows else after_id)
+
+def replay(frames, cycles, workdir, top_k=0, verbose=False, on_cycle=None, resident=False):
+    """Drive main.main() once per TIMEFRAME bar. Yields one decision record + metrics per cycle."""
+    exchange, sheet, webhook = install(frames, workdir, top_k, resident)
+    tf_ms = timeframe_ms(main.TIMEFRAME)
+    first = min(int(df['timestamp'].iloc[0]) for df in frames.values())
+    last = max(int(df['timestamp'].iloc[-1]) for df in frames.values())
+    start = first + main.BASE_WARMUP_BARS * timeframe_ms(main.BASE_TIMEFRAME)
+    start += -start % tf_ms
+    ledger, last_id = Ledger(main.LEDGER_PATH), 0
+    try:
+        for i in range(cycles):
+            bar_close = start + i * tf_ms
+            if bar_close > last: break
+            exchange.now = bar_close + main.CLOSE_DELAY_SEC * 1000
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out) if not verbose else contextlib.nullcontext():
+                main.main()
+            active, closed, last_id = decisions(ledger, last_id)
+            yield {'cycle': i, 'ts': bar_close, 'active': active, 'closed': closed}, main.metrics.last
+    finally:
+        ledger.close()
+
+# ---------- commands ----------
+def cmd_record(args):
+    backtest.load_history(args.symbols, '1m', args.fixtures, fetch_days=args.days)
+
+def load_frames(args):
+    if args.synthetic:
+        bars = main.BASE_WARMUP_BARS + (args.cycles + 1) * timeframe_ms(main.TIMEFRAME) // timeframe_ms(main.BASE_TIMEFRAME)
+        return synthetic(args.synthetic, bars, args.seed)
+    frames = backtest.load_history(args.symbols or main.SYMBOLS, '1m', args.fixtures)
+    if not frames: raise SystemExit(f"❌ No 1m candles under {args.fixtures} (use `replay.py record`)")
+    return frames
+
+def cmd_run(args):
+    frames = load_frames(args)
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    lines, trades = [], 0
+    started = time.perf_counter()
+    try:
+        for record, _ in replay(frames, args.cycles, workdir, args.top_k, args.verbose, resident=args.resident):
+            lines.append(json.dumps(record, sort_keys=True))
+            trades += len(record['closed'])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+    digest = hashlib.sha256('\n'.join(lines).encode()).hexdigest()[:16]
+    print(f"🎞️ {len(lines)} cycles x {len(frames)} symbols in {elapsed:.2f}s | {trades} trades closed | digest {digest}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w') as f: f.write('\n'.join(lines) + '\n')
+        print(f"💾 Decisions saved to {args.out}")
+    if args.check:
+        with open(args.check) as f: expected = f.read().splitlines()
+        for a, b in zip(expected, lines):
+            if a != b:
+                print(f"❌ Decisions differ at cycle {json.loads(a)['cycle']}:\n   expected {a}\n   got      {b}")
+                raise SystemExit(1)
+        if len(expected) != len(lines):
+            print(f"❌ Cycle count differs: expected {len(expected)}, got {len(lines)}")
+            raise SystemExit(1)
+        print(f"✅ Identical decisions to {args.check}")
+
+def cmd_bench(args):
+    print(f"{'symbols':>8} | {'cold':>7} | {'p50':>7} | {'p95':>7} | {'max':>7} | calls/cycle | slowest stages (mean)")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        bars = main.BASE_WARMUP_BARS + (args.cycles + 2) * timeframe_ms(main.TIMEFRAME) // timeframe_ms(main.BASE_TIMEFRAME)
+        frames = synthetic(n, bars, args.seed)
+        workdir = tempfile.mkdtemp(prefix='bench-')
+        records = []
+        try:
+            for _, m in replay(frames, args.cycles + 1, workdir, args.top_k, resident=args.resident): records.append(m)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        cold, warm = records[0], records[1:]
+        lat = np.array([r['cycle_sec'] for r in warm]) * 1000
+        stages = {}
+        for r in warm:
+            for k, v in r['stages'].items(): stages[k] = stages.get(k, 0.0) + v['sec'] / len(warm)
+        calls = {}
+        for r in warm:
+            for k, v in r['calls'].items(): calls[k] = calls.get(k, 0) + v / len(warm)
+        top = ', '.join(f"{k} {v * 1000:.1f}ms" for k, v in sorted(stages.items(), key=lambda kv: -kv[1])[:4])
+        print(f"{n:>8} | {cold['cycle_sec']:>6.2f}s | {np.percentile(lat, 50):>5.0f}ms | {np.percentile(lat, 95):>5.0f}ms | "
+              f"{lat.max():>5.0f}ms | {' '.join(f'{k} {v:.0f}' for k, v in calls.items()):<11} | {top}")
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+            with open(args.out, 'a') as f:
+                f.write(json.dumps({'symbols': n, 'cold': cold, 'cycles': warm}) + '\n')
+    print("   (per-symbol stages such as fetch are summed over the worker threads, so they can exceed the cycle)")
+
+def cmd_fetch(args):
+    # concurrency check: with a slow exchange, N symbols should cost about one round trip
+    # (plus rateLimit spacing between request starts), not N of them
+    frames = synthetic(args.symbols, main.BASE_WARMUP_BARS + 10, args.seed)
+    workdir = tempfile.mkdtemp(prefix='fetch-')
+    try:
+        exchange, _, _ = install(frames, workdir)
+        exchange.now = int(max(df['timestamp'].iloc[-1] for df in frames.values())) - 5 * exchange.base_ms
+        main.fetch_all(frames)                         # warm the candle store without latency
+        exchange.now += exchange.base_ms               # one new bar: one request per symbol
+        exchange.latency, exchange.rateLimit = args.latency, args.rate_limit
+        started = time.perf_counter()
+        frames_out = main.fetch_all(list(frames), max_workers=args.workers)
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    waves = -(-args.symbols // args.workers)
+    expected = waves * args.latency + (args.symbols - 1) * args.rate_limit / 1000
+    ok = all(df is not None for df in frames_out.values()) and elapsed < expected * 1.5 + 0.1
+    print(f"{'✅' if ok else '❌'} {args.symbols} symbols x {args.latency * 1000:.0f} ms latency, {args.workers} workers: "
+          f"{elapsed:.2f}s (expected ~{expected:.2f}s, serial would be {args.symbols * args.latency:.2f}s)")
+    if not ok: raise SystemExit(1)
+
+def cmd_memory(args):
+    # what a long-running daemon keeps per symbol (resident base candles, MultiTimeframe book, indicator
+    # state) and what one cycle allocates on top of it: the DataFrame path (sync + frame) vs the
+    # resident path (advance + closed_after) the daemon uses
+    bars = main.BASE_RETENTION_BARS + args.extra_bars
+    frames = synthetic(args.symbols, bars, args.seed)
+    exchange = FakeExchange(frames, main.BASE_TIMEFRAME)
+    base_ms = timeframe_ms(main.BASE_TIMEFRAME)
+    start = int(max(df['timestamp'].iloc[0] for df in frames.values())) + main.BASE_RETENTION_BARS * base_ms
+    end = int(max(df['timestamp'].iloc[-1] for df in frames.values())) + base_ms // 2
+    workdir = tempfile.mkdtemp(prefix='memory-')
+    try:
+        store = CandleStore(os.path.join(workdir, 'candles'), warmup_bars=main.BASE_WARMUP_BARS,
+                            retention_bars=main.BASE_RETENTION_BARS)
+        engine = IndicatorEngine(os.path.join(workdir, 'indicators'), main.TIMEFRAME)
+        builder = lambda book: book.builders[main.TIMEFRAME]
+
+        def cycle(symbol, book, now_ms):
+            fetch = lambda since, limit: exchange.fetch_ohlcv(symbol, main.BASE_TIMEFRAME, since, limit)
+            new, forming, reset = store.advance(fetch, symbol, main.BASE_TIMEFRAME, now_ms)
+            book.advance(new, forming, store.history(symbol, main.BASE_TIMEFRAME) if reset else None)
+            engine.feed(symbol, lambda after: builder(book).closed_after(after, now_ms))
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        books = {s: MultiTimeframe(main.BASE_TIMEFRAME, main.BOOK_TIMEFRAMES, keep=main.RETENTION_BARS) for s in frames}
+        # warm up, then stream the extra bars in slices like consecutive cycles so every ring fills up
+        step = (args.extra_bars // 4 or 1) * base_ms
+        for now_ms in list(range(start, end, step)) + [end]:
+            exchange.now = now_ms
+            for symbol, book in books.items(): cycle(symbol, book, now_ms)
+        resident = tracemalloc.get_traced_memory()[0] - before
+
+        # one more bar: peak allocation of a cycle per symbol on each path
+        exchange.now = now_ms = end + base_ms
+        peaks = {'frames': 0, 'resident': 0}
+        for symbol, book in books.items():
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            cycle(symbol, book, now_ms)
+            peaks['resident'] = max(peaks['resident'], tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            df = store.sync(lambda since, limit: [], symbol, main.BASE_TIMEFRAME, now_ms)   # the same bars from disk
+            book.update(df, now_ms)
+            engine.update(symbol, book.frame(main.TIMEFRAME), now_ms)
+            peaks['frames'] = max(peaks['frames'], tracemalloc.get_traced_memory()[1] - base)
+            del df
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    n = args.symbols
+    print(f"🧠 {n} symbols, {main.BASE_RETENTION_BARS} {main.BASE_TIMEFRAME} bars + "
+          f"{len(main.BOOK_TIMEFRAMES)} timeframes x {main.RETENTION_BARS} bars kept")
+    print(f"   resident {resident / n / 1024:,.1f} KiB per symbol ({resident / 2**20:,.1f} MiB) | "
+          f"cycle peak per symbol: DataFrame path {peaks['frames'] / 1024:,.1f} KiB, resident path {peaks['resident'] / 1024:,.1f} KiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay main() on recorded candles and benchmark the cycle")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('record', help="download 1m fixtures from OKX into a CandleStore directory")
+    p.add_argument('--symbols', nargs='+', required=True)
+    p.add_argument('--days', type=int, default=7)
+    p.add_argument('--fixtures', default='data/fixtures')
+
+    p = sub.add_parser('run', help="replay bar by bar and log every decision")
+    p.add_argument('--fixtures', default='data/fixtures')
+    p.add_argument('--symbols', nargs='*', help="default: SYMBOLS from main.py")
+    p.add_argument('--synthetic', type=int, default=0, help="N random-walk symbols instead of fixtures")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--cycles', type=int, default=288)
+    p.add_argument('--top-k', type=int, default=0, help="screen the fixtures with fetch_tickers (0 = trade all)")
+    p.add_argument('--out', help="write the decision log (JSONL) here")
+    p.add_argument('--check', help="compare against a saved decision log, exit 1 on any difference")
+    p.add_argument('--verbose', action='store_true', help="show main()'s own output")
+    p.add_argument('--resident', action='store_true', help="keep candles in memory between cycles (the --daemon path)")
+
+    p = sub.add_parser('bench', help="cycle latency, stage timings and API calls vs universe size")
+    p.add_argument('--sizes', default='5,50,500')
+    p.add_argument('--cycles', type=int, default=10, help="warm cycles per size (after one cold start)")
+    p.add_argument('--top-k', type=int, default=0)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--out', help="append raw per-cycle metrics (JSONL)")
+    p.add_argument('--resident', action='store_true', help="keep candles in memory between cycles (the --daemon path)")
+
+    p = sub.add_parser('memory', help="resident bytes per tracked symbol and the per-cycle allocation peak")
+    p.add_argument('--symbols', type=int, default=200)
+    p.add_argument('--extra-bars', type=int, default=10_000, help="1m bars streamed after the initial load (~1 week)")
+    p.add_argument('--seed', type=int, default=0)
+
+    p = sub.add_parser('fetch', help="check that fetch_all overlaps requests against a slow stub exchange")
+    p.add_argument('--symbols', type=int, default=30)
+    p.add_argument('--latency', type=float, default=0.2, help="seconds per request")
+    p.add_argument('--rate-limit', type=float, default=0, help="ms between request starts (ccxt rateLimit)")
+    p.add_argument('--workers', type=int, default=main.FETCH_WORKERS)
+    p.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    {'record': cmd_record, 'run': cmd_run, 'bench': cmd_bench, 'memory': cmd_memory, 'fetch': cmd_fetch}[args.cmd](args)
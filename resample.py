@@ -0,0 +1,214 @@
+import argparse
+import numpy as np
+import pandas as pd
+from candle_store import COLUMNS, timeframe_ms
+from ring import RingBuffer
+
+# ==========================================
+# 🧱 MULTI-TIMEFRAME BARS FROM ONE BASE STREAM
+# ==========================================
+# Only base (1m) candles are fetched and stored; 5m / 15m / 1h / 4h bars are
+# rolled up from them. Buckets are floor(ts / timeframe), the same UTC grid
+# OKX uses up to 4H. Frames keep the shape CandleStore.sync() returns: closed
+# bars followed by the still-forming bar, so downstream code decides what is
+# closed from `timestamp + timeframe <= now_ms` exactly as before.
+
+def resample(df, timeframe):
+    """Vectorized rollup of base candles (sorted, unique timestamps) into `timeframe` bars."""
+    if df is None or not len(df): return pd.DataFrame(columns=COLUMNS)
+    tf = timeframe_ms(timeframe)
+    ts = df['timestamp'].to_numpy(dtype=np.int64)
+    bucket = ts // tf * tf
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return pd.DataFrame({
+        'timestamp': bucket[starts],
+        'open': df['open'].to_numpy(dtype=float)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=float), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=float), starts),
+        'close': df['close'].to_numpy(dtype=float)[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(dtype=float), starts),
+    })
+
+def ema(values, window=200):
+    # same definition as ta.trend.ema_indicator (NaN until `window` bars exist)
+    return pd.Series(values, dtype=float).ewm(span=window, adjust=False, min_periods=window).mean().to_numpy()
+
+def align(base_ts, base_timeframe, htf_ts, htf_timeframe, values):
+    """For every base bar, the value of the last higher-timeframe bar that had closed
+    when the base bar closed (no look-ahead). NaN before the first one."""
+    base_close = np.asarray(base_ts, dtype=np.int64) + timeframe_ms(base_timeframe)
+    htf_close = np.asarray(htf_ts, dtype=np.int64) + timeframe_ms(htf_timeframe)
+    idx = np.searchsorted(htf_close, base_close, side='right') - 1
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(base_close), np.nan)
+    ok = idx >= 0
+    out[ok] = values[idx[ok]]
+    return out
+
+class BarBuilder:
+    """One target timeframe, fed closed base bars in time order. O(1) per bar.
+
+    Closed bars live in a preallocated (keep x 6) float64 ring written in place;
+    prices stay float64 because they end up as booked entry / exit prices.
+    """
+    __slots__ = ('timeframe', 'tf_ms', 'closed', 'partial')
+
+    def __init__(self, timeframe, keep=2000):
+        self.timeframe = timeframe
+        self.tf_ms = timeframe_ms(timeframe)
+        self.closed = RingBuffer(keep, len(COLUMNS))
+        self.partial = None                 # [ts, o, h, l, c, v] of the bucket being filled
+
+    def add(self, ts, o, h, l, c, v):
+        bucket = int(ts) // self.tf_ms * self.tf_ms
+        p = self.partial
+        if p is not None and p[0] == bucket:
+            if h > p[2]: p[2] = h
+            if l < p[3]: p[3] = l
+            p[4] = c
+            p[5] += v
+            return
+        if p is not None: self.closed.append(p)
+        self.partial = [bucket, o, h, l, c, v]
+
+    def seed(self, bars):
+        """Bulk load from a resample() frame (last row becomes the open bucket)."""
+        rows = bars[COLUMNS].to_numpy(dtype=float)
+        self.closed.clear()
+        self.closed.extend(rows[:-1])
+        self.partial = [int(rows[-1, 0]), *rows[-1, 1:].tolist()] if len(rows) else None
+
+    def frame(self, forming=None):
+        """Closed bars + the open bucket, with the forming base bar folded into a copy of it."""
+        tail = []
+        p = list(self.partial) if self.partial is not None else None
+        if forming is not None:
+            ts, o, h, l, c, v = forming
+            bucket = int(ts) // self.tf_ms * self.tf_ms
+            if p is not None and p[0] == bucket:
+                p[2], p[3], p[4], p[5] = max(p[2], h), min(p[3], l), c, p[5] + v
+            else:
+                if p is not None: tail.append(p)
+                p = [bucket, o, h, l, c, v]
+        if p is not None: tail.append(p)
+        rows = np.concatenate((self.closed.view(), np.array(tail, dtype=float).reshape(-1, len(COLUMNS))))
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df['timestamp'] = df['timestamp'].astype(np.int64)
+        return df
+
+    def closed_after(self, after, now_ms):
+        """(n x 6) bars closed by `now_ms` with timestamp > after (all of them for None), no frame built.
+
+        The open bucket counts once its time is up, the same rows frame() filtered by
+        `timestamp + timeframe <= now_ms` would give.
+        """
+        if after is None:
+            rows = self.closed.view()
+        else:
+            k = 1
+            while k < len(self.closed) and self.closed.last(k)[0, 0] > after: k *= 2
+            rows = self.closed.last(k)
+            rows = rows[rows[:, 0] > after]
+        p = self.partial
+        if p is not None and p[0] + self.tf_ms <= now_ms and (after is None or p[0] > after):
+            rows = np.concatenate((rows, np.array([p], dtype=float)))
+        return rows
+
+class MultiTimeframe:
+    """Per-symbol set of BarBuilders kept in sync with a base-timeframe candle frame."""
+    __slots__ = ('base', 'base_ms', 'builders', 'last_ts', 'forming')
+
+    def __init__(self, base_timeframe='1m', timeframes=('5m', '15m', '1h', '4h'), keep=2000):
+        self.base = base_timeframe
+        self.base_ms = timeframe_ms(base_timeframe)
+        self.builders = {tf: BarBuilder(tf, keep) for tf in timeframes}
+        self.last_ts = None                 # newest closed base bar folded in
+        self.forming = None
+
+    def update(self, df, now_ms):
+        """df: base candles (closed + forming) as from CandleStore.sync; read results with frame()."""
+        ts = df['timestamp'].to_numpy(dtype=np.int64)
+        is_closed = ts + self.base_ms <= now_ms
+        closed = df[is_closed]
+        if self.last_ts is None or (len(closed) and closed['timestamp'].iloc[0] > self.last_ts):
+            # first call, or the store was re-backfilled past a gap: rebuild in one vectorized pass
+            for tf, b in self.builders.items(): b.seed(resample(closed, tf))
+        else:
+            new = closed[closed['timestamp'] > self.last_ts]
+            for row in new[COLUMNS].itertuples(index=False, name=None):
+                for b in self.builders.values(): b.add(*row)
+        if len(closed): self.last_ts = int(closed['timestamp'].iloc[-1])
+        forming = df[~is_closed]
+        self.forming = tuple(forming[COLUMNS].iloc[-1]) if len(forming) else None
+
+    def advance(self, new, forming, history=None):
+        """Resident counterpart of update(): new / forming are RECORD arrays from CandleStore.advance.
+
+        Only the new closed base bars are folded in; `history` (all resident closed base bars)
+        is needed on the first call or after the store was re-backfilled.
+        """
+        if history is not None or self.last_ts is None:
+            closed = pd.DataFrame(history, columns=COLUMNS)
+            for tf, b in self.builders.items(): b.seed(resample(closed, tf))
+            if len(history): self.last_ts = int(history['timestamp'][-1])
+        else:
+            for row in new.tolist():
+                for b in self.builders.values(): b.add(*row)
+            if len(new): self.last_ts = int(new['timestamp'][-1])
+        self.forming = forming[-1].tolist() if len(forming) else None
+
+    def last_close(self):
+        """Latest price seen: the forming base bar, else the newest closed one."""
+        if self.forming is not None: return self.forming[4]
+        return next(iter(self.builders.values())).partial[4]
+
+    def frame(self, timeframe):
+        return self.builders[timeframe].frame(self.forming)
+
+if __name__ == "__main__":
+    # consistency check: incremental rollup == one vectorized resample, cycle by cycle
+    parser = argparse.ArgumentParser(description="Check incremental multi-timeframe rollup")
+    parser.add_argument('--bars', type=int, default=20_000, help="1m bars to replay")
+    parser.add_argument('--step', type=int, default=5, help="base bars per simulated cycle")
+    args = parser.parse_args()
+
+    import time
+    rng = np.random.default_rng(0)
+    n, base_ms = args.bars, timeframe_ms('1m')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    keep = rng.uniform(size=n) > 0.02          # ~2% missing minutes (no trades)
+    base = pd.DataFrame({'timestamp': 1_700_000_000_000 + np.arange(n, dtype=np.int64) * base_ms,
+                         'open': open_, 'high': np.maximum(open_, close) * 1.001,
+                         'low': np.minimum(open_, close) * 0.999, 'close': close,
+                         'volume': rng.uniform(1, 10, n)})[keep].reset_index(drop=True)
+
+    from candle_store import RECORD
+    records = np.array(list(base.itertuples(index=False, name=None)), dtype=RECORD)
+    mtf = MultiTimeframe(keep=10**6)
+    resident = MultiTimeframe(keep=10**6)      # daemon path: RECORD slices, no frames
+    elapsed, cycles, fed_at = 0.0, 0, 3000 - args.step
+    for end in range(3000, len(base) + 1, args.step):
+        now_ms = int(base['timestamp'].iloc[end - 1]) + base_ms // 2     # last bar still forming
+        started = time.perf_counter()
+        mtf.update(base.iloc[:end], now_ms)
+        frame = mtf.frame('5m')   # what a cycle reads
+        elapsed += time.perf_counter() - started
+        cycles += 1
+        new, forming = records[fed_at:end - 1], records[end - 1:end]
+        resident.advance(new, forming, records[:end - 1] if cycles == 1 else None)
+        fed_at = end - 1
+        b = resident.builders['5m']
+        expect = frame[frame['timestamp'] + b.tf_ms <= now_ms][COLUMNS].to_numpy(dtype=float)
+        assert np.array_equal(b.closed_after(None, now_ms), expect)
+        assert np.array_equal(b.closed_after(expect[-3, 0], now_ms), expect[-2:])
+    for tf in mtf.builders:
+        assert np.array_equal(mtf.frame(tf).to_numpy(dtype=float), resident.frame(tf).to_numpy(dtype=float)), tf
+    print("✅ advance() (resident) matches update() on every timeframe and cycle")
+    for tf in mtf.builders:
+        f = mtf.frame(tf)
+        ref = resample(base.iloc[:end], tf)
+        assert np.allclose(f[COLUMNS].to_numpy(dtype=float), ref[COLUMNS].to_numpy(dtype=float)), tf
+        print(f"✅ {tf}: {len(f)} bars identical to a full resample")
+    print(f"⏱️ {cycles} incremental updates in {elapsed:.2f}s ({elapsed / cycles * 1000:.2f} ms each, incl. frame build)")
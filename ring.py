@@ -0,0 +1,57 @@
+import numpy as np
+
+# ==========================================
+# ⭕ FIXED-SIZE RING BUFFER (preallocated, updated in place)
+# ==========================================
+# Replaces deques of Python floats / tuples in long-lived per-symbol state:
+# one contiguous NumPy block per buffer, no per-value objects, no regrowth.
+
+class RingBuffer:
+    """Last `capacity` values (or rows of `width` values) in one preallocated array."""
+    __slots__ = ('data', 'capacity', 'head', 'n')
+
+    def __init__(self, capacity, width=None, dtype=np.float64, values=()):
+        self.data = np.empty((capacity,) if width is None else (capacity, width), dtype=dtype)
+        self.capacity = capacity
+        self.head = 0                  # next slot to write
+        self.n = 0
+        if len(values): self.extend(values)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def full(self):
+        return self.n == self.capacity
+
+    def oldest(self):
+        return self.data[self.head if self.full else 0]
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.n < self.capacity: self.n += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)[-self.capacity:]
+        k = len(values)
+        if not k: return
+        first = min(k, self.capacity - self.head)
+        self.data[self.head:self.head + first] = values[:first]
+        self.data[:k - first] = values[first:]
+        self.head = (self.head + k) % self.capacity
+        self.n = min(self.n + k, self.capacity)
+
+    def last(self, k):
+        """Newest k values, oldest first (a k-row copy, no full view)."""
+        k = min(k, self.n)
+        return self.data[(self.head - k + np.arange(k)) % self.capacity]
+
+    def clear(self):
+        self.head = self.n = 0
+
+    def view(self):
+        """Values oldest first (a view until the buffer wraps, then one copy)."""
+        if not self.full: return self.data[:self.n]
+        if self.head == 0: return self.data
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+from candle_store import timeframe_ms
+from strategy import entry_signals
+from indicators import EMA_WINDOW, ADX_WINDOW, RSI_WINDOW, VOL_MA_WINDOW, VWAP_WINDOW
+
+# ==========================================
+# 🧮 VECTORIZED SCANNER (symbols x bars panel)
+# ==========================================
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+def build_panel(frames, now_ms, timeframe, bars=None):
+    """Stack the closed bars of every frame into right-aligned (symbols x bars) arrays.
+
+    Shorter histories are left-padded with NaN. Returns (symbols, {field: 2D array}, last_ts).
+    """
+    tf_ms = timeframe_ms(timeframe)
+    closed = {}
+    for symbol, df in frames.items():
+        if df is None: continue
+        df = df[df['timestamp'] + tf_ms <= now_ms]
+        if bars: df = df.tail(bars)
+        if not df.empty: closed[symbol] = df
+
+    symbols = list(closed)
+    width = max((len(df) for df in closed.values()), default=0)
+    panel = {f: np.full((len(symbols), width), np.nan) for f in FIELDS}
+    last_ts = np.zeros(len(symbols), dtype=np.int64)
+    for i, symbol in enumerate(symbols):
+        df = closed[symbol]
+        for f in FIELDS:
+            panel[f][i, width - len(df):] = df[f].to_numpy(dtype=float)
+        last_ts[i] = df['timestamp'].iloc[-1]
+    return symbols, panel, last_ts
+
+def _rolling_sum(x, count, window):
+    # window sums from a cumulative sum; NaN padding counts as 0 but is masked by `count`
+    csum = np.cumsum(np.nan_to_num(x), axis=1)
+    out = csum.copy()
+    out[:, window:] -= csum[:, :-window]
+    out[count < window] = np.nan
+    return out
+
+def _ewm(x, alpha):
+    # recursive smoothing y = (1 - alpha) * y + alpha * x along bars, in C via pandas;
+    # leading NaNs are skipped, so each row starts at its own first valid value
+    return pd.DataFrame(x.T).ewm(alpha=alpha, adjust=False).mean().to_numpy().T
+
+def _wilder(x, rel, window):
+    """Wilder running sum seeded with sum(x[rel 1..window]) and then S = S - S/window + x."""
+    a = 1.0 / window
+    seed = np.where((rel >= 1) & (rel <= window), x, 0.0).sum(axis=1)
+    y = np.where(rel > window, x / a, np.nan)
+    y[rel == window] = np.broadcast_to(seed[:, None], y.shape)[rel == window]
+    return _ewm(y, a)
+
+def compute_indicators(high, low, close, volume):
+    """Column-wise EMA200 / ADX14 / RSI7 / vol_ma20 / VWAP288 for a (symbols x bars) panel.
+
+    Matches calculate_indicators() in main.py. Every recursive indicator is an
+    exponential smoothing, so each one is a single pandas ewm pass over all symbols.
+    """
+    high, low, close, volume = (np.atleast_2d(np.asarray(a, dtype=float)) for a in (high, low, close, volume))
+    S, T = close.shape
+    valid = ~np.isnan(close)
+    count = np.cumsum(valid, axis=1)
+    rel = count - 1                      # index of each bar within its own history
+    rel[~valid] = -1
+    w = ADX_WINDOW
+    out = {}
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['ema200'] = np.where(count >= EMA_WINDOW, _ewm(close, 2.0 / (EMA_WINDOW + 1)), np.nan)
+
+        prev_close = np.full_like(close, np.nan); prev_close[:, 1:] = close[:, :-1]
+        prev_high = np.full_like(high, np.nan); prev_high[:, 1:] = high[:, :-1]
+        prev_low = np.full_like(low, np.nan); prev_low[:, 1:] = low[:, :-1]
+
+        # RSI: the first bar of each history contributes a zero gain/loss, like ta
+        diff = close - prev_close
+        up = np.where(rel == 0, 0.0, np.where(rel > 0, np.maximum(diff, 0.0), np.nan))
+        dn = np.where(rel == 0, 0.0, np.where(rel > 0, np.maximum(-diff, 0.0), np.nan))
+        up, dn = _ewm(up, 1.0 / RSI_WINDOW), _ewm(dn, 1.0 / RSI_WINDOW)
+        rsi = np.where(dn == 0, 100.0, 100 - 100 / (1 + up / dn))
+        out['rsi7'] = np.where(count >= RSI_WINDOW, rsi, np.nan)
+
+        tr = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+        d_up, d_dn = high - prev_high, prev_low - low
+        pdm = np.where((d_up > d_dn) & (d_up > 0), d_up, 0.0)
+        ndm = np.where((d_dn > d_up) & (d_dn > 0), d_dn, 0.0)
+        tr_s, pdm_s, ndm_s = (_wilder(x, rel, w) for x in (tr, pdm, ndm))
+        dip = np.where(tr_s != 0, 100 * pdm_s / tr_s, 0.0)
+        din = np.where(tr_s != 0, 100 * ndm_s / tr_s, 0.0)
+        dx = np.where(dip + din != 0, 100 * np.abs(dip - din) / (dip + din), 0.0)
+        dx[rel < w] = np.nan
+        # ADX seeds with the mean of the first `w` DX values, then Wilder-averages
+        first = np.where((rel >= w) & (rel <= 2 * w - 1), dx, 0.0).sum(axis=1) / w
+        z = np.where(rel > 2 * w - 1, dx, np.nan)
+        z[rel == 2 * w - 1] = np.broadcast_to(first[:, None], z.shape)[rel == 2 * w - 1]
+        out['adx'] = _ewm(z, 1.0 / w)
+
+        out['vol_ma'] = _rolling_sum(volume, count, VOL_MA_WINDOW) / VOL_MA_WINDOW
+        typical = (high + low + close) / 3.0
+        out['vwap'] = _rolling_sum(typical * volume, count, VWAP_WINDOW) / _rolling_sum(volume, count, VWAP_WINDOW)
+    return out
+
+def evaluate_signals(table, **thresholds):
+    """Add the entry predicates of the live strategy as boolean columns (one row per symbol)."""
+    if table.empty: return table
+    table = table.copy()
+    signals = entry_signals(table['close'], table['volume'], table['ema200'], table['adx'],
+                            table['vol_ma'], table['vwap'], table['rsi7'], **thresholds)
+    for k, v in signals.items(): table[k] = v
+    return table
+
+def scan_panel(frames, now_ms, timeframe, bars=None, **thresholds):
+    """One-pass scan: returns the signal table for the last closed bar of every symbol."""
+    symbols, panel, last_ts = build_panel(frames, now_ms, timeframe, bars)
+    if not symbols: return pd.DataFrame()
+    ind = compute_indicators(panel['high'], panel['low'], panel['close'], panel['volume'])
+    table = pd.DataFrame({f: panel[f][:, -1] for f in FIELDS}, index=symbols)
+    table.insert(0, 'timestamp', last_ts)
+    for k, v in ind.items(): table[k] = v[:, -1]
+    return evaluate_signals(table, **thresholds)
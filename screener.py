@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# ==========================================
+# 🌐 UNIVERSE SCREENER (one fetch_tickers call for the whole exchange)
+# ==========================================
+# Stage 1 ranks every spot USDT market from a single bulk ticker call by 24h
+# quote volume and 24h range; only the top-K survivors go through the candle
+# fetch + indicator pipeline (stage 2). The result is cached on disk and
+# refreshed once per `refresh_sec`.
+# Off unless main.SCREENER_TOP_K > 0. Each symbol that enters the universe
+# without a candle store pays a full warmup (~30 history pages at 1m), so
+# a fresh top-30 costs on the order of 900 REST calls in its first cycle.
+STABLES = {'USDC', 'USDT', 'DAI', 'TUSD', 'FDUSD', 'USDG', 'PYUSD', 'USDE', 'EURC', 'USDD', 'BUSD'}
+
+def _rank(x):
+    # 0..1 percentile rank
+    order = np.argsort(x, kind='stable')
+    ranks = np.empty(len(x))
+    ranks[order] = np.arange(len(x))
+    return ranks / max(len(x) - 1, 1)
+
+def rank_tickers(tickers, quote='USDT', min_quote_volume=1_000_000, vol_weight=0.5):
+    """tickers: ccxt fetch_tickers() dict. Returns [(symbol, score, quote_volume, range_pct)] best first."""
+    rows = []
+    for symbol, t in tickers.items():
+        if ':' in symbol or not symbol.endswith('/' + quote): continue   # spot pairs only
+        if symbol.split('/')[0] in STABLES: continue
+        qv, last, high, low = t.get('quoteVolume'), t.get('last'), t.get('high'), t.get('low')
+        if not qv or not last or high is None or low is None or qv < min_quote_volume: continue
+        rows.append((symbol, float(qv), (float(high) - float(low)) / float(last) * 100))
+    if not rows: return []
+    qv = np.array([r[1] for r in rows])
+    rng = np.array([r[2] for r in rows])
+    score = (1 - vol_weight) * _rank(qv) + vol_weight * _rank(rng)
+    ranked = sorted(zip(rows, score), key=lambda x: (-x[1], -x[0][1]))
+    return [(symbol, float(s), q, r) for (symbol, q, r), s in ranked]
+
+class UniverseScreener:
+    def __init__(self, path='data/universe.json', top_k=30, refresh_sec=3600, quote='USDT',
+                 min_quote_volume=1_000_000, vol_weight=0.5):
+        self.path = path
+        self.top_k = top_k
+        self.refresh_sec = refresh_sec
+        self.quote = quote
+        self.min_quote_volume = min_quote_volume
+        self.vol_weight = vol_weight
+        self.cache = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f: return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f: json.dump(self.cache, f)
+        os.replace(tmp, self.path)
+
+    def stale(self, now=None):
+        now = time.time() if now is None else now
+        return (self.cache is None or self.cache.get('top_k') != self.top_k
+                or now - self.cache.get('updated_at', 0) >= self.refresh_sec)
+
+    def refresh(self, client, now=None):
+        ranked = rank_tickers(client.fetch_tickers(), self.quote, self.min_quote_volume, self.vol_weight)
+        self.cache = {
+            'updated_at': time.time() if now is None else now,
+            'top_k': self.top_k,
+            'markets': len(ranked),
+            'symbols': [r[0] for r in ranked[:self.top_k]],
+            'ranking': [[round(x, 4) if isinstance(x, float) else x for x in r] for r in ranked[:self.top_k]],
+        }
+        self._save()
+        print(f"🌐 Universe refreshed: top {len(self.cache['symbols'])} of {len(ranked)} markets")
+        return self.cache['symbols']
+
+    def universe(self, client, fallback=(), now=None):
+        """Cached top-K; refreshes when stale. On an exchange error keeps the old list (or `fallback`)."""
+        if self.stale(now):
+            try: return self.refresh(client, now)
+            except Exception as e:
+                print(f"⚠️ Screener failed, keeping previous universe: {e}")
+        return list(self.cache['symbols']) if self.cache else list(fallback)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank OKX spot markets by volume and volatility")
+    parser.add_argument('--top', type=int, default=30)
+    parser.add_argument('--min-quote-volume', type=float, default=1_000_000)
+    parser.add_argument('--vol-weight', type=float, default=0.5)
+    args = parser.parse_args()
+
+    import ccxt
+    started = time.perf_counter()
+    tickers = ccxt.okx({'enableRateLimit': True}).fetch_tickers()
+    ranked = rank_tickers(tickers, min_quote_volume=args.min_quote_volume, vol_weight=args.vol_weight)
+    print(f"🌐 {len(tickers)} tickers -> {len(ranked)} eligible in {time.perf_counter() - started:.2f}s (1 call)")
+    for symbol, score, qv, rng in ranked[:args.top]:
+        print(f"{symbol:<14} score {score:.3f} | 24h vol {qv:>16,.0f} USDT | range {rng:5.2f}%")
@@ -0,0 +1,85 @@
+# ==========================================
+# 📒 WRITE-BEHIND SHEET JOURNAL
+# ==========================================
+# Mutations made during a cycle are kept in memory and written with one call
+# per worksheet in flush(). The SQLite ledger is the durable copy; this only
+# batches its snapshot into the sheet (see ledger.SheetMirror).
+ACTIVE_HEADER = ['Symbol', 'Side', 'Entry', 'Current_SL', 'Trailing_Step', 'Margin_Size', 'Timestamp']
+
+def _col(n):
+    return chr(ord('A') + n - 1)
+
+class SheetJournal:
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self._ws = {}
+        self.balance = None
+        self.version = None          # ledger version mirrored into summary!B2
+        self.active = None           # active_trades values, header first
+        self._active_height = 0      # rows currently on the sheet
+        self._history = []
+        self._dirty = set()
+
+    def worksheet(self, name):
+        if name not in self._ws: self._ws[name] = self.sheet.worksheet(name)
+        return self._ws[name]
+
+    # ---------- reads (once per cycle) ----------
+    def refresh(self):
+        """Load active_trades; summary is read by the caller (SheetMirror.load_sheet) in one get."""
+        values = self.worksheet('active_trades').get_all_values()
+        self.active = values if values else [list(ACTIVE_HEADER)]
+        self._active_height = len(values)
+        self._history = []
+        self._dirty = set()
+
+    def active_records(self):
+        header = self.active[0]
+        return [dict(zip(header, row)) for row in self.active[1:]]
+
+    # ---------- buffered writes ----------
+    def set_balance(self, balance, version=None):
+        self.balance = float(balance)
+        self.version = version
+        self._dirty.add('summary')
+
+    def set_active(self, rows):
+        self.active = [list(ACTIVE_HEADER)] + [list(r) for r in rows]
+        self._dirty.add('active_trades')
+
+    def add_history(self, row):
+        self._history.append(list(row))
+        self._dirty.add('trade_history')
+
+    # ---------- flush ----------
+    def _payload(self):
+        payload = {}
+        if 'summary' in self._dirty:
+            payload['summary'] = [self.balance] if self.version is None else [self.balance, self.version]
+        if 'active_trades' in self._dirty:
+            width = max(len(r) for r in self.active)
+            height = max(self._active_height, len(self.active))
+            # rows that were closed this cycle are blanked so the table shrinks
+            rows = [list(r) + [''] * (width - len(r)) for r in self.active]
+            rows += [[''] * width for _ in range(height - len(rows))]
+            payload['active_trades'] = {'range': f"A1:{_col(width)}{height}", 'values': rows}
+        if 'trade_history' in self._dirty:
+            payload['trade_history'] = self._history
+        return payload
+
+    def _apply(self, name, data):
+        ws = self.worksheet(name)
+        if name == 'summary':
+            ws.batch_update([{'range': f"B1:B{len(data)}", 'values': [[v] for v in data]}])
+        elif name == 'active_trades':
+            ws.batch_update([data])
+        elif name == 'trade_history':
+            ws.append_rows(data)
+
+    def flush(self):
+        payload = self._payload()
+        if not payload: return
+        for name, data in payload.items(): self._apply(name, data)
+        if 'active_trades' in payload: self._active_height = len(self.active)
+        self._history = []
+        self._dirty = set()
@@ -0,0 +1,337 @@
+import os
+import hashlib
+import threading
+import argparse
+
+# ==========================================
+# 🛑 EXCHANGE-SIDE STOP ORDERS (OKX conditional orders via ccxt)
+# ==========================================
+# mode='paper' (default): stops live only in the ledger, every call is a no-op.
+# mode='live': each open trade gets a reduce-only conditional stop-market order
+# on the USDT swap of its symbol, so protection no longer waits for the next
+# cycle to observe a price beyond Current_SL.
+#   - ids: algoClOrdId is derived from (symbol, open timestamp), so retries after
+#     a crash or timeout can never place a second stop for the same trade
+#   - amends: trailing moves are queued and coalesced per symbol (latest step
+#     wins) and sent once per flush(); OKX amends algo orders one per request,
+#     so a burst of steps in one cycle costs one call per symbol, not per step
+#   - fills: reconcile() pulls the algo order history in one call and returns
+#     the triggered stops with their actual fill price for close_trade()
+#   - exits: while a stop is on the exchange it owns the exit. A ledger SL hit
+#     (spot candle or tick) does not close the trade or cancel the stop, because
+#     that would leave the real swap position unprotected; the trade closes
+#     when reconcile() sees the stop fill, at the real fill price
+# The order records live in the ledger (stop_orders table), not on the sheet.
+#
+# ⚠️ The bot itself only keeps paper positions; it never opens one on OKX. A
+# live stop is only placed when the account already holds a swap position on
+# the same side (opened by whoever mirrors the bot's trades), and is sized to
+# the smaller of the ledger notional and that position, so reduce-only can't
+# flip it. Symbols with no USDT swap (many screener spot pairs), or with no
+# matching position, are refused with a warning and keep the ledger-only SL.
+# Note a matching position is not necessarily the bot's: a manual position on
+# the same swap and side will be protected (and closed) by the bot's stop.
+
+def client_id(symbol, opened):
+    # OKX: 1-32 alphanumerics, starting with a letter
+    return 'sl' + hashlib.sha1(f"{symbol}|{opened}".encode()).hexdigest()[:24]
+
+class StopOrders:
+    def __init__(self, client=None, mode='paper', leverage=10, td_mode='cross', market_suffix=':USDT'):
+        if mode not in ('paper', 'live'): raise ValueError(f"unknown stop mode {mode!r}")
+        if mode == 'live' and client is None: raise ValueError("live stop orders need an authenticated client")
+        self.client = client
+        self.mode = mode
+        self.leverage = leverage
+        self.td_mode = td_mode
+        self.market_suffix = market_suffix
+        self.pending = {}              # symbol -> (new_sl, new_step) waiting for flush()
+        self._lock = threading.Lock()  # pending is touched by tick-watcher threads and the cycle
+
+    @property
+    def live(self):
+        return self.mode == 'live'
+
+    def market(self, symbol):
+        return symbol if ':' in symbol else symbol + self.market_suffix
+
+    def _markets(self):
+        # ccxt caches after the first call; market() / amount_to_precision() fail before it
+        return self.client.load_markets()
+
+    def _position(self, market, side):
+        """Contracts held on `market` on the trade's side (0 when flat or on the other side)."""
+        held = 0.0
+        for p in self.client.fetch_positions([market]):
+            if p.get('symbol') == market and p.get('side') == side.lower(): held += float(p.get('contracts') or 0)
+        return held
+
+    def _amount(self, market, entry, margin_size):
+        # same notional the ledger books: margin x leverage, in contracts
+        contract = self.client.market(market).get('contractSize') or 1
+        return float(self.client.amount_to_precision(market, margin_size * self.leverage / entry / contract))
+
+    def protects(self, ledger, symbol):
+        """True while an exchange stop owns the exit of this trade."""
+        return self.live and symbol in ledger.stop_orders()
+
+    # ---------- place / amend ----------
+    def place(self, ledger, symbol, side, entry, sl, margin_size, opened):
+        """Protect a newly opened trade. Safe to call again for the same trade."""
+        if not self.live or symbol in ledger.stop_orders(): return
+        market, cid = self.market(symbol), client_id(symbol, opened)
+        try:
+            if market not in self._markets():
+                print(f"⚠️ No {market} swap on the exchange, {symbol} keeps its ledger-only SL")
+                return
+            held = self._position(market, side)
+            if held <= 0:
+                print(f"⚠️ No {side} position on {market}, {symbol} keeps its ledger-only SL")
+                return
+            amount = min(self._amount(market, entry, margin_size), held)
+        except Exception as e:
+            # precision / min-amount errors included: the trade is already booked, keep the ledger SL
+            print(f"❌ Stop order for {symbol} skipped, market/position lookup failed: {e}")
+            return
+        params = {'stopLossPrice': sl, 'reduceOnly': True, 'tdMode': self.td_mode, 'clientOrderId': cid}
+        try:
+            order = self.client.create_order(market, 'market', 'sell' if side == 'LONG' else 'buy', amount, None, params)
+            order_id = order['id']
+        except Exception as e:
+            # a retry of a request that did land: OKX rejects the duplicate id, the stop is already there
+            try: order_id = self._find(market, cid)
+            except Exception: order_id = None
+            if order_id is None:
+                print(f"❌ Stop order for {symbol} failed: {e}")
+                return
+        ledger.save_stop(symbol, cid, order_id, sl, 0)
+        print(f"🛑 Stop placed {symbol} @ {sl:.6g} ({cid})")
+
+    def _find(self, market, cid):
+        for order in self.client.fetch_open_orders(market, params={'ordType': 'conditional'}):
+            if (order.get('info') or {}).get('algoClOrdId') == cid or order.get('clientOrderId') == cid:
+                return order['id']
+        return None
+
+    def amend(self, symbol, new_sl, new_step):
+        """Queue a trailing move; flush() sends it. Older queued steps for the symbol are dropped."""
+        if not self.live: return
+        with self._lock:
+            queued = self.pending.get(symbol)
+            if queued is None or new_step > queued[1]: self.pending[symbol] = (new_sl, new_step)
+
+    def flush(self, ledger):
+        with self._lock:
+            if not self.pending: return
+            pending, self.pending = self.pending, {}
+        stops = ledger.stop_orders()
+        amended = 0
+        for symbol, (sl, step) in pending.items():
+            stop = stops.get(symbol)
+            if stop is None or step <= stop['step']: continue
+            market = self.market(symbol)
+            try:
+                self._markets()            # a fresh run may amend before it has placed anything
+                self.client.private_post_trade_amend_algos({
+                    'instId': self.client.market(market)['id'], 'algoClOrdId': stop['client_id'],
+                    'newSlTriggerPx': self.client.price_to_precision(market, sl), 'newSlOrdPx': '-1'})
+            except Exception as e:
+                # keep the move queued; the ledger SL still protects through the next cycle
+                print(f"⚠️ Stop amend {symbol} failed, retrying next flush: {e}")
+                self.amend(symbol, sl, step)
+                continue
+            ledger.save_stop(symbol, stop['client_id'], stop['order_id'], sl, step)
+            amended += 1
+        if amended or self.pending: print(f"🛑 Stops amended: {amended} ({len(self.pending)} retrying)")
+
+    # ---------- fills ----------
+    def reconcile(self, ledger):
+        """[(symbol, fill_price)] for stops that executed on the exchange since the last call."""
+        if not self.live: return []
+        stops = ledger.stop_orders()
+        if not stops: return []
+        cid = lambda o: (o.get('info') or {}).get('algoClOrdId') or o.get('clientOrderId')
+        # open first, history second: a stop that triggers in between still shows up in the history
+        live = {cid(o) for o in self.client.fetch_open_orders(None, None, None,
+                                                             params={'ordType': 'conditional', 'instType': 'SWAP'})}
+        # trigger=True routes ccxt to the algo history (state=effective); without it ccxt sends state=filled
+        history = self.client.fetch_closed_orders(None, None, None,
+                                                  params={'trigger': True, 'ordType': 'conditional', 'instType': 'SWAP'})
+        by_cid = {cid(o): o for o in history}
+        fills = []
+        for symbol, stop in stops.items():
+            order = by_cid.get(stop['client_id'])
+            if order is None:
+                if stop['client_id'] not in live:
+                    # cancelled / failed outside the bot: the ledger SL takes the exit back
+                    print(f"⚠️ Stop for {symbol} is gone from the exchange, back to the ledger SL")
+                    ledger.drop_stop(symbol)
+                continue
+            fills.append((symbol, self._fill_price(order, symbol, stop['sl'])))
+        return fills
+
+    def _fill_price(self, order, symbol, sl):
+        if order.get('average'): return float(order['average'])
+        child = (order.get('info') or {}).get('ordId')
+        if child:
+            # the algo record only has the trigger; the market order it spawned has the fill
+            filled = self.client.fetch_order(child, self.market(symbol))
+            if filled.get('average'): return float(filled['average'])
+        return float(sl)
+
+# ==========================================
+# 🧪 LOCAL MOCK EXCHANGE (the ccxt surface StopOrders uses)
+# ==========================================
+class MockExchange:
+    """Conditional stop-market orders that trigger on tick(symbol, price) and fill at that price."""
+
+    def __init__(self, contract_size=1.0, fail_once=(), swaps=('BTC/USDT:USDT',)):
+        self.contract_size = contract_size
+        self.swaps = swaps
+        self.markets = None            # like ccxt: nothing until load_markets()
+        self.positions = {}            # (symbol, 'long'|'short') -> contracts
+        self.orders = {}               # algo id -> order dict
+        self.fills = {}                # child order id -> order dict
+        self.requests = []             # (method, args) in call order
+        self.fail_once = set(fail_once)
+        self._seq = 0
+
+    def _log(self, method, *args):
+        self.requests.append((method, args))
+        if method in self.fail_once:
+            self.fail_once.discard(method)
+            raise ConnectionError(f"mock timeout in {method}")
+
+    def load_markets(self):
+        if self.markets is None:
+            self._log('load_markets')
+            self.markets = {s: {'id': s.split(':')[0].replace('/', '-') + '-SWAP', 'symbol': s,
+                                'contractSize': self.contract_size} for s in self.swaps}
+        return self.markets
+
+    def market(self, symbol):
+        if self.markets is None: raise ValueError("okx markets not loaded")
+        if symbol not in self.markets: raise ValueError(f"okx does not have market symbol {symbol}")
+        return self.markets[symbol]
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._log('fetch_positions', symbols)
+        return [{'symbol': s, 'side': side, 'contracts': n} for (s, side), n in self.positions.items()
+                if n > 0 and (symbols is None or s in symbols)]
+
+    def amount_to_precision(self, symbol, amount):
+        return f"{amount:.4f}"
+
+    def price_to_precision(self, symbol, price):
+        return f"{price:.8g}"
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        cid = params['clientOrderId']
+        if any(o['clientOrderId'] == cid for o in self.orders.values()):
+            self._log('create_order', symbol, cid)
+            raise ValueError("51016 Duplicated clOrdId")
+        self._seq += 1
+        order = {'id': f"A{self._seq}", 'clientOrderId': cid, 'symbol': symbol, 'side': side, 'amount': amount,
+                 'stopLossPrice': float(params['stopLossPrice']), 'status': 'open', 'average': None,
+                 'info': {'algoClOrdId': cid, 'ordId': ''}}
+        self.orders[order['id']] = order       # lands even if the response is lost below
+        self._log('create_order', symbol, cid)
+        return order
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._log('fetch_open_orders', symbol)
+        return [o for o in self.orders.values() if o['status'] == 'open' and symbol in (None, o['symbol'])]
+
+    def private_post_trade_amend_algos(self, request):
+        self._log('amend_algos', request['algoClOrdId'], request['newSlTriggerPx'])
+        for o in self.orders.values():
+            if o['clientOrderId'] == request['algoClOrdId'] and o['status'] == 'open':
+                o['stopLossPrice'] = float(request['newSlTriggerPx'])
+                return {'code': '0'}
+        raise ValueError("51603 Order does not exist")
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._log('cancel_order', id)
+        if self.orders[id]['status'] == 'open': self.orders[id]['status'] = 'canceled'
+        return self.orders[id]
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._log('fetch_closed_orders')
+        # ccxt only uses the algo history endpoint with trigger/stop; otherwise it adds state=filled,
+        # which /trade/orders-algo-history rejects
+        if not (params.get('trigger') or params.get('stop')):
+            raise ValueError("51000 Parameter state error")
+        # state=effective: triggered stops only
+        return [dict(o, average=None) for o in self.orders.values() if o['status'] == 'closed']
+
+    def fetch_order(self, id, symbol=None, params={}):
+        self._log('fetch_order', id)
+        return self.fills[id]
+
+    def tick(self, symbol, price):
+        for o in self.orders.values():
+            if o['status'] != 'open' or o['symbol'] != symbol: continue
+            hit = price <= o['stopLossPrice'] if o['side'] == 'sell' else price >= o['stopLossPrice']
+            if hit:
+                self._seq += 1
+                child = f"O{self._seq}"
+                o['status'] = 'closed'
+                o['info']['ordId'] = child
+                key = (symbol, 'long' if o['side'] == 'sell' else 'short')
+                self.positions[key] = max(self.positions.get(key, 0) - o['amount'], 0)
+                self.fills[child] = {'id': child, 'symbol': symbol, 'average': price, 'status': 'closed'}
+
+if __name__ == "__main__":
+    # end-to-end check against the mock: open -> trail (coalesced) -> gap through the stop -> reconcile
+    parser = argparse.ArgumentParser(description="Exercise StopOrders against the local mock exchange")
+    parser.add_argument('--ledger', default='data/stop_orders_demo.db')
+    args = parser.parse_args()
+
+    from ledger import Ledger
+    if os.path.exists(args.ledger): os.remove(args.ledger)
+    ledger = Ledger(args.ledger)
+    ledger.bootstrap(200.0, [], [])
+    ex = MockExchange(contract_size=0.01, fail_once={'create_order'}, swaps=('BTC/USDT:USDT', 'ETH/USDT:USDT'))
+    stops = StopOrders(ex, mode='live', leverage=10)
+
+    # refused: no swap for the pair / no position on the account to protect
+    stops.place(ledger, 'NOSWAP/USDT', 'LONG', 1.0, 0.9, 20.0, 'x')
+    stops.place(ledger, 'BTC/USDT', 'LONG', 100.0, 99.0, 20.0, 'x')
+    assert not ex.orders and not ledger.stop_orders()
+
+    opened = '2026-01-01 00:00:00'
+    ex.positions[('BTC/USDT:USDT', 'long')] = 200.0                          # 20 USDT x10 / 100 / 0.01 contracts
+    ledger.open_trade('BTC/USDT', 'LONG', 100.0, 99.0, 20.0, opened)
+    stops.place(ledger, 'BTC/USDT', 'LONG', 100.0, 99.0, 20.0, opened)      # response lost -> recovered by id
+    stops.place(ledger, 'BTC/USDT', 'LONG', 100.0, 99.0, 20.0, opened)      # retry: no second order
+    assert len(ex.orders) == 1, ex.orders
+
+    for step, sl in [(1, 100.5), (2, 101.0), (3, 102.5)]:                   # three steps inside one cycle
+        ledger.update_sl('BTC/USDT', sl, step)
+        stops.amend('BTC/USDT', sl, step)
+    stops.flush(ledger)
+    amends = [r for r in ex.requests if r[0] == 'amend_algos']
+    assert len(amends) == 1 and ex.orders['A1']['stopLossPrice'] == 102.5, amends
+
+    ex.tick('BTC/USDT:USDT', 103.0)
+    assert stops.reconcile(ledger) == []
+    assert stops.protects(ledger, 'BTC/USDT')    # a spot SL hit now waits for the swap stop instead of closing
+    ex.tick('BTC/USDT:USDT', 102.1)                                              # gaps through 102.5
+    fills = stops.reconcile(ledger)
+    assert fills == [('BTC/USDT', 102.1)], fills
+    assert ex.positions[('BTC/USDT:USDT', 'long')] == 0
+    from strategy import trade_roe, trade_pnl
+    roe = trade_roe('LONG', 100.0, fills[0][1], 10)
+    ledger.close_trade('BTC/USDT', fills[0][1], trade_pnl(20.0, roe), roe, "Exchange Stop Fill", opened)
+    ledger.drop_stop('BTC/USDT')
+
+    # a stop cancelled by hand on the exchange hands the exit back to the ledger SL
+    ex.positions[('ETH/USDT:USDT', 'short')] = 100.0
+    ledger.open_trade('ETH/USDT', 'SHORT', 50.0, 51.0, 20.0, opened)
+    stops.place(ledger, 'ETH/USDT', 'SHORT', 50.0, 51.0, 20.0, opened)
+    eth = next(o for o in ex.orders.values() if o['symbol'] == 'ETH/USDT:USDT')
+    ex.cancel_order(eth['id'], eth['symbol'])
+    assert stops.reconcile(ledger) == [] and not stops.protects(ledger, 'ETH/USDT')
+    print(f"✅ 2 unprotectable trades refused, 1 stop placed despite a lost response, 3 trail steps -> {len(amends)} amend call, "
+          f"fill booked at {fills[0][1]} (stop {ex.orders['A1']['stopLossPrice']}), balance {ledger.balance():.4f}")
+    print("   requests: " + ", ".join(r[0] for r in ex.requests))
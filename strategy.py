@@ -0,0 +1,61 @@
+# ==========================================
+# 🎯 STRATEGY RULES (shared by live bot, backtest & optimizer)
+# ==========================================
+# Pure functions only: no exchange, sheet or ledger access. Every function works
+# on plain floats; entry_signals() also works element-wise on numpy arrays and
+# pandas Series.
+
+def entry_signals(close, volume, ema200, adx, vol_ma, vwap, rsi7,
+                  rsi_long=40, rsi_short=60, adx_min=25, vol_mult=1.2):
+    has_volume = volume > vol_ma * vol_mult
+    trend_long = (close > ema200) & (close > vwap)
+    trend_short = (close < ema200) & (close < vwap)
+    strong_trend = adx > adx_min
+    return {
+        'has_volume': has_volume,
+        'trend_long': trend_long,
+        'trend_short': trend_short,
+        'strong_trend': strong_trend,
+        'long_entry': trend_long & strong_trend & (rsi7 < rsi_long) & has_volume,
+        'short_entry': trend_short & strong_trend & (rsi7 > rsi_short) & has_volume,
+    }
+
+def htf_filter(htf_close, htf_ema200):
+    """(long_ok, short_ok): trade only with the higher-timeframe trend. NaN blocks both."""
+    return htf_close > htf_ema200, htf_close < htf_ema200
+
+def in_session(hour, start_hour, end_hour):
+    return (start_hour <= hour) & (hour <= end_hour)
+
+def initial_sl(side, price, sl_roe, leverage):
+    if side == 'LONG': return price * (1 - (sl_roe / leverage))
+    return price * (1 + (sl_roe / leverage))
+
+def trade_roe(side, entry, price, leverage):
+    # สูตร: (Exit - Entry) / Entry * Leverage
+    if side == 'LONG': return ((price - entry) / entry) * leverage
+    return ((entry - price) / entry) * leverage
+
+def trade_pnl(margin_size, roe):
+    # same booking as close_trade() has always used
+    return margin_size * (roe / 100)
+
+def sl_hit(side, price, sl):
+    if side == 'LONG': return price <= sl
+    return price >= sl
+
+def trail_trigger(side, entry, step, step_roe, leverage):
+    """Price at which the position reaches the next trailing step."""
+    move = (step + 1) * step_roe / leverage
+    return entry * (1 + move) if side == 'LONG' else entry * (1 - move)
+
+def trail_update(side, entry, step, price, step_roe, leverage):
+    """Return (new_step, new_sl) when `price` earns the next step, else None.
+
+    Each step locks the profit of the previous one: step n moves SL to (n-1) * step_roe.
+    """
+    if trade_roe(side, entry, price, leverage) < (step + 1) * step_roe: return None
+    new_step = step + 1
+    locked_roe = (new_step - 1) * step_roe
+    if side == 'LONG': return new_step, entry * (1 + (locked_roe / leverage))
+    return new_step, entry * (1 - (locked_roe / leverage))